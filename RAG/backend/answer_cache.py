@@ -0,0 +1,204 @@
+import re
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from config import config
+from logger import logger
+
+@dataclass
+class CachedAnswer:
+    """A generated answer plus what is needed to validate it later."""
+    answer: str
+    sources: List[Dict[str, Any]]
+    query_vector: Optional[np.ndarray]
+    item_ids: Set[int]
+    min_score: float
+    created_at: float = field(default_factory=time.monotonic)
+
+class AnswerCache:
+    """
+    Cache of generated answers for repeated and near-duplicate questions.
+    
+    The first tier matches on normalized question text; the second compares
+    the query embedding against cached questions and reuses an answer above
+    ANSWER_CACHE_SIMILARITY. Entries expire after a TTL, are evicted LRU once
+    the cache is full, and are dropped when an item they drew on is deleted
+    or a newly added chunk would have ranked among their sources.
+    """
+    
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None,
+                 similarity_threshold: float = None):
+        self.max_entries = max_entries if max_entries is not None else config.ANSWER_CACHE_SIZE
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config.ANSWER_CACHE_TTL_SECONDS
+        self.similarity_threshold = (
+            similarity_threshold if similarity_threshold is not None else config.ANSWER_CACHE_SIMILARITY
+        )
+        self._entries: "OrderedDict[Tuple[str, str], CachedAnswer]" = OrderedDict()
+        # Query vectors of the entries stacked into one matrix, rebuilt after changes
+        self._stacked: Optional[Tuple[List[Tuple[str, str]], List[CachedAnswer], np.ndarray, np.ndarray]] = None
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+    
+    @staticmethod
+    def normalize(question: str) -> str:
+        """Normalize question text so trivial variations share a cache key."""
+        text = re.sub(r"\s+", " ", question.lower()).strip()
+        return text.rstrip("?!. ")
+    
+    @staticmethod
+    def _unit(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def _expired(self, entry: CachedAnswer) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl_seconds
+    
+    def get(self, question: str, scope: str) -> Optional[CachedAnswer]:
+        """Look up an answer by normalized question text."""
+        if not self.enabled:
+            return None
+        
+        key = (scope, self.normalize(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                del self._entries[key]
+                self._stacked = None
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+            return entry
+    
+    def get_similar(self, query_embedding: Sequence[float], scope: str) -> Optional[CachedAnswer]:
+        """Look up an answer whose question embedding is close to this one."""
+        if not self.enabled or self.similarity_threshold <= 0:
+            with self._lock:
+                self.misses += 1
+            return None
+        
+        query_vector = self._unit(query_embedding)
+        with self._lock:
+            keys = [
+                key for key, entry in self._entries.items()
+                if key[0] == scope and entry.query_vector is not None and not self._expired(entry)
+            ]
+            if keys:
+                vectors = np.vstack([self._entries[key].query_vector for key in keys])
+                similarities = vectors @ query_vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    self._entries.move_to_end(keys[best])
+                    self.semantic_hits += 1
+                    return self._entries[keys[best]]
+            self.misses += 1
+            return None
+    
+    def put(self, question: str, scope: str, answer: str, sources: List[Dict[str, Any]],
+            query_embedding: Optional[Sequence[float]], item_ids: Set[int], min_score: float):
+        """Store an answer, evicting the least recently used entries if full."""
+        if not self.enabled:
+            return
+        
+        query_vector = self._unit(query_embedding) if query_embedding is not None else None
+        key = (scope, self.normalize(question))
+        with self._lock:
+            self._entries[key] = CachedAnswer(
+                answer=answer,
+                sources=sources,
+                query_vector=query_vector,
+                item_ids=set(item_ids),
+                min_score=min_score
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._stacked = None
+    
+    def _drop(self, keys: List[Tuple[str, str]], reason: str):
+        for key in keys:
+            del self._entries[key]
+        if keys:
+            self._stacked = None
+            self.invalidations += len(keys)
+            logger.info(f"Invalidated {len(keys)} cached answers ({reason})")
+    
+    def _stack(self) -> Tuple[List[Tuple[str, str]], List[CachedAnswer], np.ndarray, np.ndarray]:
+        """Entries with a query vector, their vectors as rows and their min scores (caller holds the lock)."""
+        if self._stacked is None:
+            keys = [key for key, entry in self._entries.items() if entry.query_vector is not None]
+            entries = [self._entries[key] for key in keys]
+            vectors = np.vstack([entry.query_vector for entry in entries]) if entries else None
+            min_scores = np.array([entry.min_score for entry in entries], dtype=np.float32)
+            self._stacked = (keys, entries, vectors, min_scores)
+        return self._stacked
+    
+    def chunks_added(self, vectors: np.ndarray, metadatas: Sequence[Dict[str, Any]]):
+        """
+        Invalidate answers that new chunks would have changed.
+        
+        An entry is stale when a new chunk scores at least as high against its
+        question as the weakest chunk it was answered from. All entries are
+        scored in one matrix product, outside the lock so lookups aren't held up.
+        """
+        with self._lock:
+            if not self._entries or not len(vectors):
+                return
+            unscored = [key for key, entry in self._entries.items() if entry.query_vector is None]
+            keys, entries, query_vectors, min_scores = self._stack()
+        
+        stale_positions = []
+        if entries:
+            best = (vectors @ query_vectors.T).max(axis=0)
+            stale_positions = np.flatnonzero(best >= min_scores)
+        
+        with self._lock:
+            # Skip entries replaced or dropped while scoring
+            stale = [key for key in unscored if key in self._entries]
+            stale.extend(
+                keys[position] for position in stale_positions
+                if self._entries.get(keys[position]) is entries[position]
+            )
+            self._drop(stale, "new content")
+    
+    def chunks_removed(self, item_ids: Set[int]):
+        """Invalidate answers that drew on any of the given items."""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry.item_ids & item_ids]
+            self._drop(stale, "deleted content")
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stacked = None
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the overall hit rate."""
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'exact_hits': self.exact_hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0
+            }
+
+# Global answer cache instance
+answer_cache = AnswerCache()
@@ -0,0 +1,77 @@
+"""
+Benchmark HTML text extraction throughput.
+
+Runs every available extractor from ingestion.HTML_EXTRACTORS over a corpus
+of saved HTML pages and reports pages/s and MB/s, plus how closely each
+extractor's output length matches html.parser's.
+
+Usage (from RAG/backend):
+    python benchmarks/bench_extraction.py [--fixtures DIR] [--repeat N]
+
+Drop any saved pages (*.html) into the fixtures directory to benchmark
+against a real corpus.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ingestion import HTML_EXTRACTORS  # noqa: E402
+
+def load_fixtures(directory: Path):
+    """Read every .html file in a directory as text."""
+    pages = {
+        path.name: path.read_text(encoding='utf-8', errors='replace')
+        for path in sorted(directory.glob('*.html'))
+    }
+    if not pages:
+        sys.exit(f"No .html fixtures found in {directory}")
+    return pages
+
+def time_extractor(extractor, pages, repeat: int) -> float:
+    """Best wall time of `repeat` passes over every page."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for html in pages.values():
+            extractor.extract(html)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--fixtures', type=Path, default=Path(__file__).resolve().parent / 'fixtures',
+                        help='directory of .html pages (default: benchmarks/fixtures)')
+    parser.add_argument('--repeat', type=int, default=20, help='passes per extractor; best is reported')
+    args = parser.parse_args()
+    
+    pages = load_fixtures(args.fixtures)
+    total_mb = sum(len(html.encode('utf-8')) for html in pages.values()) / 1e6
+    print(f"{len(pages)} pages, {total_mb:.2f} MB, best of {args.repeat} passes\n")
+    
+    baseline = None
+    print(f"{'extractor':<12} {'pages/s':>9} {'MB/s':>8} {'speedup':>8} {'text chars vs html.parser':>27}")
+    for name, extractor_class in HTML_EXTRACTORS.items():
+        try:
+            extractor = extractor_class()
+        except ImportError as e:
+            print(f"{name:<12} unavailable ({e})")
+            continue
+        
+        # Warm up, and keep the output for the size comparison
+        texts = {page: extractor.extract(html) for page, html in pages.items()}
+        elapsed = time_extractor(extractor, pages, args.repeat)
+        
+        if baseline is None:
+            baseline = (elapsed, texts)
+        chars = sum(len(text) for text in texts.values())
+        baseline_chars = sum(len(text) for text in baseline[1].values())
+        print(
+            f"{name:<12} {len(pages) / elapsed:>9.1f} {total_mb / elapsed:>8.2f} "
+            f"{baseline[0] / elapsed:>7.1f}x {chars / baseline_chars:>26.1%}"
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import re
+from typing import Iterator, List, Tuple, Optional
+from config import config
+
+# Blank lines separate blocks (paragraphs, headings, lists)
+BLOCK_BREAK = re.compile(r'\n[ \t]*\n\s*')
+
+# A sentence runs to terminal punctuation (plus closing quotes/brackets)
+# followed by whitespace, or to the end of its line
+SENTENCE = re.compile(r'[^\n]*?[.!?]+["\'”’)\]]*(?=\s|$)|[^\n]+')
+
+HEADING = re.compile(r'#{1,6}\s')
+WORD = re.compile(r'\S+')
+TOKEN = re.compile(r'\w+|[^\w\s]')
+
+# Characters per token for long words, numbers and identifiers
+CHARS_PER_TOKEN = 5
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate a BPE token count without a tokenizer.
+    
+    Punctuation marks count one token each, words one per five characters
+    (common words are a single token, long or rare ones split into several).
+    """
+    return sum((len(match.group()) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN for match in TOKEN.finditer(text))
+
+def iter_blocks(text: str) -> Iterator[str]:
+    """Yield the non-empty blocks of a text, lazily."""
+    start = 0
+    for match in BLOCK_BREAK.finditer(text):
+        block = text[start:match.start()].strip()
+        if block:
+            yield block
+        start = match.end()
+    block = text[start:].strip()
+    if block:
+        yield block
+
+def iter_sentences(block: str) -> Iterator[Tuple[str, str]]:
+    """Yield (separator, sentence) pairs; the separator is '\\n' after a line break, else ' '."""
+    end = 0
+    for match in SENTENCE.finditer(block):
+        sentence = match.group().strip()
+        if sentence:
+            yield ('\n' if '\n' in block[end:match.start()] else ' '), sentence
+        end = match.end()
+
+def split_oversized(sentence: str, max_tokens: int) -> Iterator[Tuple[str, int]]:
+    """Yield (piece, tokens) for a sentence, in word windows if it exceeds max_tokens."""
+    tokens = estimate_tokens(sentence)
+    if tokens <= max_tokens:
+        yield sentence, tokens
+        return
+    
+    words: List[str] = []
+    words_tokens = 0
+    for match in WORD.finditer(sentence):
+        word = match.group()
+        word_tokens = estimate_tokens(word)
+        
+        # A single giant token run (base64, minified code): cut it by characters
+        if word_tokens > max_tokens:
+            if words:
+                yield ' '.join(words), words_tokens
+                words, words_tokens = [], 0
+            step = max_tokens * CHARS_PER_TOKEN
+            for start in range(0, len(word), step):
+                piece = word[start:start + step]
+                yield piece, estimate_tokens(piece)
+            continue
+        
+        if words and words_tokens + word_tokens > max_tokens:
+            yield ' '.join(words), words_tokens
+            words, words_tokens = [], 0
+        words.append(word)
+        words_tokens += word_tokens
+    
+    if words:
+        yield ' '.join(words), words_tokens
+
+def chunk_text(text: str, max_tokens: Optional[int] = None,
+               overlap_tokens: Optional[int] = None) -> Iterator[str]:
+    """
+    Split text into chunks of at most max_tokens (estimated) tokens.
+    
+    Chunks are built from whole sentences and never straddle a heading.
+    A paragraph that doesn't fit in the current chunk starts a new one
+    once the current chunk is at least half full, so breaks fall between
+    paragraphs where possible; only sentences longer than the budget are
+    split between words. Up to overlap_tokens of trailing sentences are
+    repeated at the start of the next chunk.
+    
+    Works as a generator over the text: blocks and their sentences are
+    read lazily, so only the current chunk is held besides the input.
+    
+    Args:
+        text: Text to chunk
+        max_tokens: Token budget per chunk (default CHUNK_MAX_TOKENS)
+        overlap_tokens: Tokens of context carried between chunks (default CHUNK_OVERLAP_TOKENS)
+    """
+    max_tokens = max_tokens or config.CHUNK_MAX_TOKENS
+    overlap_tokens = config.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    
+    # (separator before piece, piece, tokens); pending counts pieces not yet emitted
+    current: List[Tuple[str, str, int]] = []
+    current_tokens = 0
+    pending = 0
+    
+    def flush() -> str:
+        nonlocal current, current_tokens, pending
+        chunk = current[0][1] + ''.join(separator + piece for separator, piece, _ in current[1:])
+        
+        # Carry whole trailing sentences within the overlap budget
+        carried: List[Tuple[str, str, int]] = []
+        carried_tokens = 0
+        for entry in reversed(current):
+            if carried_tokens + entry[2] > overlap_tokens:
+                break
+            carried.insert(0, entry)
+            carried_tokens += entry[2]
+        current, current_tokens, pending = carried, carried_tokens, 0
+        return chunk
+    
+    for block in iter_blocks(text):
+        pieces = (
+            (separator, piece, tokens)
+            for separator, sentence in iter_sentences(block)
+            for piece, tokens in split_oversized(sentence, max_tokens)
+        )
+        block_tokens = estimate_tokens(block)
+        
+        # Start a fresh chunk at headings, and between paragraphs when the next one won't fit
+        heading = HEADING.match(block) is not None
+        if pending and (heading or (current_tokens + block_tokens > max_tokens
+                                    and current_tokens >= max_tokens // 2)):
+            yield flush()
+        
+        # Context from before a heading belongs to the previous section
+        if heading:
+            current, current_tokens = [], 0
+        
+        for position, (separator, piece, tokens) in enumerate(pieces):
+            if current_tokens + tokens > max_tokens:
+                if pending:
+                    yield flush()
+                # Drop carried overlap that would leave no room for the piece
+                if current_tokens + tokens > max_tokens:
+                    current, current_tokens = [], 0
+            if position == 0:
+                separator = '\n\n'
+            current.append((separator, piece, tokens))
+            current_tokens += tokens
+            pending += 1
+    
+    if pending:
+        yield flush()
@@ -13,15 +13,108 @@ class Config:
     
     # Database Configuration
     DATABASE_PATH = os.getenv("DATABASE_PATH", "knowledge_inbox.db")
+    DB_THREAD_POOL_SIZE = int(os.getenv("DB_THREAD_POOL_SIZE", "4"))  # threads running SQLite work off the event loop
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))  # max open SQLite connections
+    DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+    DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+    DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "65536"))
+    DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", "268435456"))  # bytes
+    DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
     
-    # Chunking Configuration
-    CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
-    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
+    # Background ingestion jobs
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "5"))  # doubled per attempt
+    JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+    
+    # HTML text extraction: html.parser (pure Python), lxml or selectolax (C-backed, optional)
+    HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "lxml")
+    
+    # Bulk ingestion: items per embedding pass and transaction
+    BULK_GROUP_SIZE = int(os.getenv("BULK_GROUP_SIZE", "100"))
+    
+    # URL fetching (shared pooled client)
+    FETCH_MAX_CONCURRENCY = int(os.getenv("FETCH_MAX_CONCURRENCY", "16"))  # across all hosts
+    FETCH_MAX_PER_HOST = int(os.getenv("FETCH_MAX_PER_HOST", "4"))
+    FETCH_CONNECT_TIMEOUT = float(os.getenv("FETCH_CONNECT_TIMEOUT", "5"))  # seconds
+    FETCH_READ_TIMEOUT = float(os.getenv("FETCH_READ_TIMEOUT", "10"))  # seconds
+    FETCH_HTTP2 = os.getenv("FETCH_HTTP2", "true").lower() == "true"  # needs the h2 package
+    FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(5 * 1024 * 1024)))  # per page
+    FETCH_ALLOWED_CONTENT_TYPES = [
+        content_type.strip().lower()
+        for content_type in os.getenv(
+            "FETCH_ALLOWED_CONTENT_TYPES", "text/html,application/xhtml+xml,text/plain"
+        ).split(",")
+    ]
+    
+    # Periodic URL refresh
+    REFRESH_INTERVAL_SECONDS = int(os.getenv("REFRESH_INTERVAL_SECONDS", "86400"))  # default per item; 0 = only items with their own interval
+    REFRESH_JITTER = float(os.getenv("REFRESH_JITTER", "0.1"))  # +/- fraction of the interval
+    REFRESH_FETCHES_PER_MINUTE = int(os.getenv("REFRESH_FETCHES_PER_MINUTE", "30"))  # 0 disables the scheduler
+    REFRESH_CHECK_SECONDS = float(os.getenv("REFRESH_CHECK_SECONDS", "15"))
+    
+    # Chunking Configuration (sentence-aligned, sizes in estimated tokens)
+    CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "400"))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))  # trailing sentences repeated in the next chunk
+    
+    # Near-duplicate chunk detection: link (store, but don't embed or index), skip (drop) or off
+    DEDUP_MODE = os.getenv("DEDUP_MODE", "link")
+    DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))  # estimated Jaccard similarity of word shingles
+    DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "128"))  # MinHash signature length
+    DEDUP_SHINGLE_WORDS = int(os.getenv("DEDUP_SHINGLE_WORDS", "5"))
+    
+    # Embedding request batching (Azure accepts a list of inputs per request)
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "100000"))
+    
+    # Embedding cache (in-memory LRU, plus an SQLite file when a path is set)
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")
     
     # Vector Store Configuration
-    VECTOR_STORE_TYPE = os.getenv("VECTOR_STORE_TYPE", "faiss")
+    VECTOR_STORE_TYPE = os.getenv("VECTOR_STORE_TYPE", "faiss")  # flat, hnsw or faiss (IVF)
     EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "1536"))  # Azure text-embedding-ada-002
     
+    # HNSW index tuning (higher ef_search = better recall, slower queries)
+    HNSW_M = int(os.getenv("HNSW_M", "16"))
+    HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+    HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+    
+    # FAISS IVF index tuning (higher nprobe = better recall, slower queries)
+    IVF_NLIST = int(os.getenv("IVF_NLIST", "1024"))
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+    IVF_MIN_TRAIN_SIZE = int(os.getenv("IVF_MIN_TRAIN_SIZE", "40000"))  # exact search until trained
+    
+    # Deleted rows are tombstoned; compact once this share of rows is dead
+    VECTOR_COMPACTION_THRESHOLD = float(os.getenv("VECTOR_COMPACTION_THRESHOLD", "0.2"))
+    VECTOR_COMPACTION_MIN_DEAD = int(os.getenv("VECTOR_COMPACTION_MIN_DEAD", "1000"))
+    
+    # Filtered searches matching at most this many rows scan them exactly instead of using the index
+    FILTER_SCAN_MAX_ROWS = int(os.getenv("FILTER_SCAN_MAX_ROWS", "50000"))
+    
+    # Answer cache (exact question match, then query-embedding similarity)
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))  # 0 disables
+    ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))  # 0 disables semantic tier
+    
+    # Retrieval: hybrid fuses BM25 (SQLite FTS5) and vector rankings; vector or lexical use one
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+    RRF_K = int(os.getenv("RRF_K", "60"))  # reciprocal rank fusion damping
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # per-ranking depth before fusion
+    QUERY_EMBEDDING_TIMEOUT = float(os.getenv("QUERY_EMBEDDING_TIMEOUT", "3"))  # seconds, then lexical only (not applied in vector mode)
+    EMBEDDING_RETRY_SECONDS = float(os.getenv("EMBEDDING_RETRY_SECONDS", "30"))  # lexical only after a failure
+    
+    # Diversity re-ranking: maximal marginal relevance over a deeper candidate pool
+    MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1 = relevance only, 0 = novelty only
+    MMR_CANDIDATES = int(os.getenv("MMR_CANDIDATES", "20"))  # results re-ranked per query
+    MAX_CHUNKS_PER_ITEM = int(os.getenv("MAX_CHUNKS_PER_ITEM", "2"))  # 0 = no cap
+    
+    # Context packing for the answer prompt (sizes in estimated tokens)
+    CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "2000"))
+    CONTEXT_MIN_SCORE_RATIO = float(os.getenv("CONTEXT_MIN_SCORE_RATIO", "0.4"))  # drop chunks scoring below this share of the best
+    CONTEXT_SENTENCE_SELECTION = os.getenv("CONTEXT_SENTENCE_SELECTION", "false").lower() == "true"  # keep each chunk's best-matching sentences
+    CONTEXT_CHUNK_MAX_TOKENS = int(os.getenv("CONTEXT_CHUNK_MAX_TOKENS", "200"))  # per chunk, with sentence selection
+    
     # API Configuration
     MAX_RESULTS = int(os.getenv("MAX_RESULTS", "5"))
     TEMPERATURE = float(os.getenv("TEMPERATURE", "0.7"))
@@ -0,0 +1,155 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Tuple, Set
+from config import config
+from logger import logger
+from chunking import estimate_tokens, iter_blocks, iter_sentences
+
+TERM = re.compile(r'\w+')
+
+# Question words that say nothing about which sentences are relevant
+STOPWORDS = {
+    'about', 'and', 'are', 'can', 'did', 'does', 'for', 'from', 'has', 'have', 'how', 'into',
+    'its', 'not', 'the', 'that', 'this', 'was', 'were', 'what', 'when', 'where', 'which',
+    'who', 'why', 'with', 'you', 'your'
+}
+
+# Marks where sentences were left out of a trimmed chunk
+ELISION = ' … '
+
+def query_terms(question: str) -> Set[str]:
+    """Lowercased content words of a question."""
+    return {term for term in TERM.findall(question.lower()) if len(term) > 2 and term not in STOPWORDS}
+
+def select_sentences(text: str, terms: Set[str], max_tokens: int) -> Tuple[str, int]:
+    """
+    Keep the sentences of a text that best match the question, within max_tokens.
+    
+    Sentences are ranked by how many distinct question terms they contain and
+    kept in their original order. Without any matching sentence, the leading
+    sentences are kept instead.
+    
+    Returns:
+        Tuple of (text, tokens); empty if not even one sentence fits
+    """
+    sentences = [
+        (separator, sentence, estimate_tokens(sentence))
+        for block in iter_blocks(text)
+        for separator, sentence in iter_sentences(block)
+    ]
+    scores = [len(terms.intersection(TERM.findall(sentence.lower()))) for _, sentence, _ in sentences]
+    
+    if any(scores):
+        ranked = sorted((position for position, score in enumerate(scores) if score),
+                        key=lambda position: -scores[position])
+    else:
+        ranked = range(len(sentences))
+    
+    kept = []
+    tokens = 0
+    for position in ranked:
+        sentence_tokens = sentences[position][2]
+        if tokens + sentence_tokens + 1 > max_tokens:
+            continue
+        kept.append(position)
+        tokens += sentence_tokens + 1  # room for a separator or elision mark
+    
+    if not kept:
+        return "", 0
+    
+    kept.sort()
+    parts = [sentences[kept[0]][1]]
+    for previous, position in zip(kept, kept[1:]):
+        parts.append((sentences[position][0] if position == previous + 1 else ELISION) + sentences[position][1])
+    selected = ''.join(parts)
+    return selected, estimate_tokens(selected)
+
+@dataclass
+class PackedContext:
+    """Retrieved chunks fitted into the prompt's context budget."""
+    text: str
+    chunks: List[Tuple[Dict[str, Any], float]] = field(default_factory=list)  # results that made it in
+    tokens: int = 0
+    trimmed: int = 0  # chunks cut down to their best sentences
+    dropped: int = 0  # chunks left out for their score or the budget
+
+class ContextPacker:
+    """
+    Fits retrieved chunks into a token budget for the answer prompt.
+    
+    Chunks are taken best score first. Chunks scoring below
+    CONTEXT_MIN_SCORE_RATIO of the best are dropped, and a chunk that no
+    longer fits the remaining CONTEXT_MAX_TOKENS is cut down to its
+    sentences that best match the question. With sentence selection on,
+    every chunk is held to CONTEXT_CHUNK_MAX_TOKENS the same way.
+    """
+    
+    def __init__(self, max_tokens: int = None, min_score_ratio: float = None,
+                 sentence_selection: bool = None, chunk_max_tokens: int = None):
+        self.max_tokens = max_tokens or config.CONTEXT_MAX_TOKENS
+        self.min_score_ratio = min_score_ratio if min_score_ratio is not None else config.CONTEXT_MIN_SCORE_RATIO
+        self.sentence_selection = (
+            sentence_selection if sentence_selection is not None else config.CONTEXT_SENTENCE_SELECTION
+        )
+        self.chunk_max_tokens = chunk_max_tokens or config.CONTEXT_CHUNK_MAX_TOKENS
+        
+        self._lock = threading.Lock()
+        self.contexts_packed = 0
+        self.context_tokens = 0
+        self.chunks_trimmed = 0
+        self.chunks_dropped = 0
+    
+    def pack(self, question: str, results: List[Tuple[Dict[str, Any], float]]) -> PackedContext:
+        """Build the context text for a question from its retrieval results."""
+        terms = query_terms(question)
+        best = max((score for _, score in results), default=0.0)
+        packed = PackedContext("")
+        parts = []
+        
+        for chunk_data, score in sorted(results, key=lambda result: result[1], reverse=True):
+            if packed.chunks and best > 0 and score < self.min_score_ratio * best:
+                packed.dropped += 1
+                continue
+            
+            header = f"[Relevance: {score:.2f}] "
+            remaining = self.max_tokens - packed.tokens - estimate_tokens(header)
+            limit = min(remaining, self.chunk_max_tokens) if self.sentence_selection else remaining
+            
+            text = chunk_data['text']
+            text_tokens = estimate_tokens(text)
+            if text_tokens > limit:
+                text, text_tokens = select_sentences(text, terms, limit)
+                if not text:
+                    packed.dropped += 1
+                    continue
+                packed.trimmed += 1
+            
+            parts.append(header + text)
+            packed.chunks.append((chunk_data, score))
+            packed.tokens += estimate_tokens(header) + text_tokens
+        
+        packed.text = "\n\n".join(parts)
+        with self._lock:
+            self.contexts_packed += 1
+            self.context_tokens += packed.tokens
+            self.chunks_trimmed += packed.trimmed
+            self.chunks_dropped += packed.dropped
+        logger.info(
+            f"Packed {len(packed.chunks)} chunks into {packed.tokens} context tokens "
+            f"({packed.trimmed} trimmed, {packed.dropped} dropped)"
+        )
+        return packed
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'max_tokens': self.max_tokens,
+            'sentence_selection': self.sentence_selection,
+            'contexts_packed': self.contexts_packed,
+            'average_tokens': round(self.context_tokens / self.contexts_packed, 1) if self.contexts_packed else 0.0,
+            'chunks_trimmed': self.chunks_trimmed,
+            'chunks_dropped': self.chunks_dropped
+        }
+
+# Global context packer instance
+context_packer = ContextPacker()
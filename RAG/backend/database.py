@@ -1,31 +1,155 @@
+import asyncio
+import functools
+import hashlib
+import queue
+import re
 import sqlite3
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Callable
 from contextlib import contextmanager
 from config import config
 from logger import logger
+from filters import SearchFilter, format_db_timestamp
+
+def encode_embedding(embedding) -> bytes:
+    """Serialize an embedding vector to a float32 BLOB."""
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+def decode_embedding(blob: bytes) -> np.ndarray:
+    """Deserialize a float32 BLOB back into an embedding vector."""
+    return np.frombuffer(blob, dtype=np.float32)
+
+def content_hash(text: str) -> str:
+    """Fingerprint of an item's content, used to skip re-ingesting unchanged pages."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def build_fts_query(text: str) -> str:
+    """
+    Turn free text into an FTS5 MATCH expression.
+    
+    Each term is quoted so punctuation in identifiers and error codes can't
+    be parsed as FTS5 syntax, and terms are OR-ed so BM25 ranks partial matches.
+    """
+    terms = re.findall(r"\w+(?:[-.:/]\w+)*", text)
+    return " OR ".join(f'"{term}"' for term in dict.fromkeys(term.lower() for term in terms))
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections.
+    
+    Connections are opened lazily up to max_size, configured once with the
+    pragmas from Config, and handed out to one thread at a time.
+    """
+    
+    def __init__(self, db_path: str, max_size: int = None):
+        self.db_path = db_path
+        self.max_size = max_size or config.DB_POOL_SIZE
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection and apply the configured pragmas."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=config.DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA journal_mode={config.DB_JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous={config.DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size=-{config.DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={config.DB_MMAP_SIZE}")
+        conn.execute(f"PRAGMA busy_timeout={config.DB_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+    
+    def acquire(self) -> sqlite3.Connection:
+        """Take an idle connection, opening a new one while under max_size."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+                self._all.append(conn)
+                return conn
+        
+        # Pool exhausted; wait for another thread to release a connection
+        return self._idle.get()
+    
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool."""
+        self._idle.put(conn)
+    
+    @contextmanager
+    def connection(self):
+        """Context manager that commits on success and rolls back on error."""
+        conn = self.acquire()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+    
+    def close_all(self):
+        """Close every connection the pool has opened."""
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+            self._created = 0
+            self._idle = queue.LifoQueue()
 
 class Database:
     """SQLite database manager for the knowledge inbox."""
     
     def __init__(self, db_path: str = None):
         self.db_path = db_path or config.DATABASE_PATH
+        self.pool = ConnectionPool(self.db_path)
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.DB_THREAD_POOL_SIZE,
+            thread_name_prefix="db"
+        )
         self.init_db()
     
+    async def run_in_thread(self, func: Callable, *args, **kwargs):
+        """
+        Run blocking database work on the bounded database thread pool.
+        
+        Async routes use this so SQLite calls never block the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    def close(self):
+        """Shut down the database thread pool and close pooled connections."""
+        self._executor.shutdown(wait=True)
+        self.pool.close_all()
+    
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Context manager for pooled database connections."""
         try:
-            yield conn
-            conn.commit()
+            with self.pool.connection() as conn:
+                yield conn
         except Exception as e:
-            conn.rollback()
             logger.error(f"Database error: {e}")
             raise
-        finally:
-            conn.close()
     
     def init_db(self):
         """Initialize database schema."""
@@ -39,6 +163,13 @@ class Database:
                     content TEXT NOT NULL,
                     source_type TEXT NOT NULL CHECK(source_type IN ('note', 'url')),
                     url TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_hash TEXT,
+                    fetched_at TIMESTAMP,
+                    refresh_interval_seconds INTEGER,
+                    next_refresh_at REAL,
+                    citation_count INTEGER NOT NULL DEFAULT 0,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
@@ -50,24 +181,176 @@ class Database:
                     item_id INTEGER NOT NULL,
                     chunk_text TEXT NOT NULL,
                     chunk_index INTEGER NOT NULL,
+                    embedding BLOB,
+                    embedding_model TEXT,
+                    embedding_dim INTEGER,
+                    duplicate_of INTEGER REFERENCES chunks(id) ON DELETE SET NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE CASCADE
                 )
             """)
             
+            # Databases created before conditional re-fetch lack these columns
+            self._ensure_columns(cursor, "items", {
+                "etag": "TEXT",
+                "last_modified": "TEXT",
+                "content_hash": "TEXT",
+                "fetched_at": "TIMESTAMP",
+                "refresh_interval_seconds": "INTEGER",
+                "next_refresh_at": "REAL",
+                "citation_count": "INTEGER NOT NULL DEFAULT 0"
+            })
+            
+            # Databases created before embeddings were persisted lack these columns
+            self._ensure_columns(cursor, "chunks", {
+                "embedding": "BLOB",
+                "embedding_model": "TEXT",
+                "embedding_dim": "INTEGER",
+                "duplicate_of": "INTEGER REFERENCES chunks(id) ON DELETE SET NULL"
+            })
+            
+            # MinHash signatures and LSH band keys for near-duplicate detection
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_signatures (
+                    chunk_id INTEGER PRIMARY KEY,
+                    signature BLOB NOT NULL,
+                    FOREIGN KEY (chunk_id) REFERENCES chunks(id) ON DELETE CASCADE
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_lsh (
+                    band_key INTEGER NOT NULL,
+                    chunk_id INTEGER NOT NULL,
+                    PRIMARY KEY (band_key, chunk_id),
+                    FOREIGN KEY (chunk_id) REFERENCES chunks(id) ON DELETE CASCADE
+                ) WITHOUT ROWID
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_chunk_lsh_chunk_id 
+                ON chunk_lsh(chunk_id)
+            """)
+            
             # Create indexes for better query performance
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_items_source_type 
                 ON items(source_type)
             """)
             
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_items_url 
+                ON items(url)
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_items_next_refresh_at 
+                ON items(next_refresh_at)
+            """)
+            
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_chunks_item_id 
                 ON chunks(item_id)
             """)
             
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_chunks_duplicate_of 
+                ON chunks(duplicate_of)
+            """)
+            
+            self.fts_enabled = self._init_fts(cursor)
+            
+            # Ingestion jobs, so queued work survives restarts
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    content TEXT NOT NULL,
+                    source_type TEXT NOT NULL CHECK(source_type IN ('note', 'url')),
+                    status TEXT NOT NULL DEFAULT 'queued'
+                        CHECK(status IN ('queued', 'running', 'succeeded', 'failed')),
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    chunks_total INTEGER,
+                    chunks_embedded INTEGER NOT NULL DEFAULT 0,
+                    item_id INTEGER,
+                    error TEXT,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    refresh_item_id INTEGER,  -- set for re-fetches of an existing URL item
+                    run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE SET NULL
+                )
+            """)
+            
+            # Databases created before job priorities or queued refreshes lack these columns
+            self._ensure_columns(cursor, "jobs", {
+                "priority": "INTEGER NOT NULL DEFAULT 0",
+                "refresh_item_id": "INTEGER"
+            })
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after 
+                ON jobs(status, run_after)
+            """)
+            
             logger.info("Database initialized successfully")
     
+    def _init_fts(self, cursor) -> bool:
+        """
+        Create the FTS5 index over chunk text, kept in sync by triggers.
+        
+        Returns False if this SQLite build lacks FTS5; lexical search is then disabled.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'")
+        exists = cursor.fetchone() is not None
+        
+        try:
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                    chunk_text,
+                    content='chunks',
+                    content_rowid='id',
+                    tokenize='porter unicode61'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite FTS5 unavailable, lexical search disabled: {e}")
+            return False
+        
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_insert AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts(rowid, chunk_text) VALUES (new.id, new.chunk_text);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts(chunks_fts, rowid, chunk_text) VALUES ('delete', old.id, old.chunk_text);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_update AFTER UPDATE OF chunk_text ON chunks BEGIN
+                INSERT INTO chunks_fts(chunks_fts, rowid, chunk_text) VALUES ('delete', old.id, old.chunk_text);
+                INSERT INTO chunks_fts(rowid, chunk_text) VALUES (new.id, new.chunk_text);
+            END
+        """)
+        
+        # Index chunks stored before the FTS table existed
+        if not exists:
+            cursor.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+            logger.info("Built full-text index over existing chunks")
+        
+        return True
+    
+    def _ensure_columns(self, cursor, table: str, columns: Dict[str, str]):
+        """Add any missing columns to an existing table."""
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row['name'] for row in cursor.fetchall()}
+        for name, column_type in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+                logger.info(f"Added column {table}.{name}")
+    
     def insert_item(self, content: str, source_type: str, url: Optional[str] = None) -> int:
         """Insert a new item into the database."""
         with self.get_connection() as conn:
@@ -90,6 +373,236 @@ class Database:
             )
             return cursor.lastrowid
     
+    def _insert_chunks(self, cursor, item_id: int, chunks: List[str],
+                       embeddings: Optional[List[List[float]]] = None,
+                       embedding_model: Optional[str] = None,
+                       chunk_indexes: Optional[List[int]] = None) -> List[int]:
+        """
+        Insert chunks for an item with executemany and return their ids in order.
+        
+        Chunks are numbered 0..n-1 unless explicit chunk_indexes are given;
+        a None embedding leaves that chunk unembedded.
+        """
+        if not chunks:
+            return []
+        
+        if chunk_indexes is None:
+            chunk_indexes = range(len(chunks))
+        
+        if embeddings is None:
+            rows = [(item_id, chunk_text, idx, None, None, None) for idx, chunk_text in zip(chunk_indexes, chunks)]
+        else:
+            rows = [
+                (item_id, chunk_text, idx, encode_embedding(embedding), embedding_model, len(embedding))
+                if embedding is not None else (item_id, chunk_text, idx, None, None, None)
+                for idx, chunk_text, embedding in zip(chunk_indexes, chunks, embeddings)
+            ]
+        
+        cursor.executemany(
+            """INSERT INTO chunks (item_id, chunk_text, chunk_index, embedding, embedding_model, embedding_dim)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            rows
+        )
+        
+        # AUTOINCREMENT ids within one write transaction are consecutive
+        last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return list(range(last_id - len(rows) + 1, last_id + 1))
+    
+    def _save_fingerprints(self, cursor, chunk_ids: List[int],
+                           fingerprints: List[Tuple[bytes, List[int], Optional[int]]]):
+        """
+        Store MinHash signatures and LSH band keys for new chunks and link duplicates.
+        
+        Args:
+            chunk_ids: Ids of the new chunks
+            fingerprints: (signature, band_keys, duplicate_of) per chunk, where
+                duplicate_of is an existing chunk id, ~i for chunk_ids[i], or None
+        """
+        cursor.executemany(
+            "INSERT INTO chunk_signatures (chunk_id, signature) VALUES (?, ?)",
+            [(chunk_id, signature) for chunk_id, (signature, _, _) in zip(chunk_ids, fingerprints)]
+        )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO chunk_lsh (band_key, chunk_id) VALUES (?, ?)",
+            [
+                (band_key, chunk_id)
+                for chunk_id, (_, band_keys, _) in zip(chunk_ids, fingerprints)
+                for band_key in band_keys
+            ]
+        )
+        cursor.executemany(
+            "UPDATE chunks SET duplicate_of = ? WHERE id = ?",
+            [
+                (chunk_ids[~duplicate_of] if duplicate_of < 0 else duplicate_of, chunk_id)
+                for chunk_id, (_, _, duplicate_of) in zip(chunk_ids, fingerprints)
+                if duplicate_of is not None
+            ]
+        )
+    
+    def insert_chunks(self, item_id: int, chunks: List[str],
+                      embeddings: Optional[List[List[float]]] = None,
+                      embedding_model: Optional[str] = None) -> List[int]:
+        """
+        Insert all chunks for an item in a single transaction.
+        
+        Returns:
+            Chunk ids in the same order as the chunks
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            return self._insert_chunks(cursor, item_id, chunks, embeddings, embedding_model)
+    
+    def insert_item_with_chunks(self, content: str, source_type: str, url: Optional[str],
+                                chunks: List[str],
+                                embeddings: Optional[List[List[float]]] = None,
+                                embedding_model: Optional[str] = None,
+                                etag: Optional[str] = None,
+                                last_modified: Optional[str] = None,
+                                fingerprints: Optional[List[Tuple[bytes, List[int], Optional[int]]]] = None) -> Tuple[int, List[int], str]:
+        """
+        Insert an item and all of its chunks (with embeddings) in a single transaction.
+        
+        For URL items, etag and last_modified are the HTTP validators of the fetch;
+        fingerprints are the chunks' near-duplicate data (see _save_fingerprints).
+        
+        Returns:
+            Tuple of (item_id, chunk_ids, created_at) with chunk ids in chunk order
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            item_id, chunk_ids, created_at = self._insert_item_with_chunks(
+                cursor, content, source_type, url, chunks, embeddings, embedding_model, etag, last_modified
+            )
+            if fingerprints:
+                self._save_fingerprints(cursor, chunk_ids, fingerprints)
+            logger.info(f"Inserted item {item_id} of type {source_type} with {len(chunk_ids)} chunks")
+            return item_id, chunk_ids, created_at
+    
+    def _insert_item_with_chunks(self, cursor, content: str, source_type: str, url: Optional[str],
+                                 chunks: List[str], embeddings: Optional[List[List[float]]],
+                                 embedding_model: Optional[str], etag: Optional[str] = None,
+                                 last_modified: Optional[str] = None) -> Tuple[int, List[int], str]:
+        """Insert an item and its chunks using an open cursor."""
+        cursor.execute(
+            """INSERT INTO items (content, source_type, url, etag, last_modified, content_hash, fetched_at)
+               VALUES (?, ?, ?, ?, ?, ?, CASE WHEN ? IS NULL THEN NULL ELSE CURRENT_TIMESTAMP END)""",
+            (content, source_type, url, etag, last_modified, content_hash(content), url)
+        )
+        item_id = cursor.lastrowid
+        chunk_ids = self._insert_chunks(cursor, item_id, chunks, embeddings, embedding_model)
+        created_at = cursor.execute("SELECT created_at FROM items WHERE id = ?", (item_id,)).fetchone()[0]
+        return item_id, chunk_ids, created_at
+    
+    def insert_items_with_chunks(self, items: List[Tuple[str, str, Optional[str], List[str], List[List[float]],
+                                                         Optional[str], Optional[str]]],
+                                 embedding_model: Optional[str] = None,
+                                 fingerprints: Optional[List[Tuple[bytes, List[int], Optional[int]]]] = None) -> List[Tuple[int, List[int], str]]:
+        """
+        Insert many items with their chunks and embeddings in a single transaction.
+        
+        Args:
+            items: List of (content, source_type, url, chunks, embeddings, etag, last_modified)
+            embedding_model: Embedding deployment that produced the vectors
+            fingerprints: Near-duplicate data for every chunk of every item, in order
+        
+        Returns:
+            (item_id, chunk_ids, created_at) for each item, in input order
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            inserted = [
+                self._insert_item_with_chunks(
+                    cursor, content, source_type, url, chunks, embeddings, embedding_model, etag, last_modified
+                )
+                for content, source_type, url, chunks, embeddings, etag, last_modified in items
+            ]
+            if fingerprints:
+                self._save_fingerprints(cursor, [chunk_id for _, ids, _ in inserted for chunk_id in ids], fingerprints)
+            logger.info(f"Inserted {len(inserted)} items with {sum(len(ids) for _, ids, _ in inserted)} chunks")
+            return inserted
+    
+    def mark_item_fetched(self, item_id: int, etag: Optional[str], last_modified: Optional[str]):
+        """Record a re-fetch that found the content unchanged."""
+        with self.get_connection() as conn:
+            conn.execute(
+                """UPDATE items
+                   SET etag = ?, last_modified = ?, fetched_at = CURRENT_TIMESTAMP, next_refresh_at = NULL
+                   WHERE id = ?""",
+                (etag, last_modified, item_id)
+            )
+    
+    def update_item_content(self, item_id: int, content: str, etag: Optional[str], last_modified: Optional[str],
+                            reindexed: List[Tuple[int, int]], added: List[Tuple[int, str]],
+                            embeddings: List[Optional[List[float]]], removed_chunk_ids: List[int],
+                            embedding_model: Optional[str] = None,
+                            fingerprints: Optional[List[Tuple[bytes, List[int], Optional[int]]]] = None) -> Tuple[List[int], List[int]]:
+        """
+        Apply a re-fetched version of an item in a single transaction.
+        
+        Near-duplicates elsewhere that link to removed chunks are promoted
+        (see promote_duplicates) in the same transaction.
+        
+        Args:
+            reindexed: (chunk_id, new_chunk_index) for kept chunks that moved
+            added: (chunk_index, chunk_text) for new chunks, embedded as `embeddings`
+            removed_chunk_ids: Chunks no longer in the content
+            fingerprints: Near-duplicate data for the added chunks
+        
+        Returns:
+            Tuple of (ids of the added chunks in the order given, ids of promoted chunks)
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            promoted = self._promote_duplicates(cursor, removed_chunk_ids) if removed_chunk_ids else []
+            cursor.execute(
+                """UPDATE items
+                   SET content = ?, content_hash = ?, etag = ?, last_modified = ?,
+                       fetched_at = CURRENT_TIMESTAMP, next_refresh_at = NULL
+                   WHERE id = ?""",
+                (content, content_hash(content), etag, last_modified, item_id)
+            )
+            cursor.executemany("DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in removed_chunk_ids])
+            cursor.executemany(
+                "UPDATE chunks SET chunk_index = ? WHERE id = ?",
+                [(chunk_index, chunk_id) for chunk_id, chunk_index in reindexed]
+            )
+            chunk_ids = self._insert_chunks(
+                cursor, item_id,
+                [chunk_text for _, chunk_text in added],
+                embeddings,
+                embedding_model,
+                [chunk_index for chunk_index, _ in added]
+            )
+            if fingerprints:
+                self._save_fingerprints(cursor, chunk_ids, fingerprints)
+            logger.info(
+                f"Updated item {item_id}: {len(chunk_ids)} chunks added, "
+                f"{len(removed_chunk_ids)} removed, {len(reindexed)} moved"
+            )
+            return chunk_ids, promoted
+    
+    def save_chunk_embeddings(self, embeddings: List[Tuple[int, List[float]]], model: str):
+        """
+        Persist embeddings for existing chunks in a single transaction.
+        
+        Args:
+            embeddings: List of (chunk_id, embedding) pairs
+            model: Embedding deployment that produced the vectors
+        """
+        if not embeddings:
+            return
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "UPDATE chunks SET embedding = ?, embedding_model = ?, embedding_dim = ? WHERE id = ?",
+                [
+                    (encode_embedding(embedding), model, len(embedding), chunk_id)
+                    for chunk_id, embedding in embeddings
+                ]
+            )
+            logger.info(f"Saved {len(embeddings)} chunk embeddings")
+    
     def get_all_items(self, source_type: Optional[str] = None) -> List[Dict[str, Any]]:
         """Retrieve all items, optionally filtered by source type."""
         with self.get_connection() as conn:
@@ -114,6 +627,79 @@ class Database:
             row = cursor.fetchone()
             return dict(row) if row else None
     
+    def get_item_by_url(self, url: str) -> Optional[Dict[str, Any]]:
+        """Retrieve the most recent item ingested from a URL."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM items WHERE url = ? AND source_type = 'url' ORDER BY id DESC LIMIT 1",
+                (url,)
+            )
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    
+    def set_refresh_interval(self, item_id: int, interval_seconds: Optional[int]) -> bool:
+        """Set an item's refresh interval (None for the default, 0 to never refresh) and reschedule it."""
+        with self.get_connection() as conn:
+            cursor = conn.execute(
+                "UPDATE items SET refresh_interval_seconds = ?, next_refresh_at = NULL WHERE id = ?",
+                (interval_seconds, item_id)
+            )
+            return cursor.rowcount > 0
+    
+    def add_citations(self, counts: Dict[int, int]):
+        """Add to the number of answers each item was cited as a source of."""
+        with self.get_connection() as conn:
+            conn.executemany(
+                "UPDATE items SET citation_count = citation_count + ? WHERE id = ?",
+                [(count, item_id) for item_id, count in counts.items()]
+            )
+    
+    def schedule_url_refreshes(self, default_interval: int, jitter: float) -> int:
+        """
+        Give URL items without a next refresh time one, an interval after their last fetch.
+        
+        Each interval is scaled by a random factor in [1 - jitter, 1 + jitter]
+        so items ingested together don't come due together.
+        
+        Returns:
+            Number of items scheduled
+        """
+        with self.get_connection() as conn:
+            cursor = conn.execute("""
+                UPDATE items
+                SET next_refresh_at = CAST(strftime('%s', COALESCE(fetched_at, created_at)) AS REAL)
+                    + COALESCE(refresh_interval_seconds, :interval)
+                    * (1 + :jitter * (2 * (abs(random()) / 9223372036854775807.0) - 1))
+                WHERE source_type = 'url'
+                  AND next_refresh_at IS NULL
+                  AND COALESCE(refresh_interval_seconds, :interval) > 0
+            """, {'interval': default_interval, 'jitter': jitter})
+            return cursor.rowcount
+    
+    def claim_due_refreshes(self, now: float, limit: int, default_interval: int) -> List[Dict[str, Any]]:
+        """
+        Take up to `limit` URL items due for refresh, most-cited first.
+        
+        Claimed items are pushed a full interval out, so they aren't claimed
+        again while their refresh is pending; a completed refresh
+        reschedules them from the new fetch time.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, url, COALESCE(refresh_interval_seconds, ?) AS interval FROM items
+                WHERE source_type = 'url' AND next_refresh_at <= ?
+                ORDER BY citation_count DESC, next_refresh_at
+                LIMIT ?
+            """, (default_interval, now, limit))
+            rows = [dict(row) for row in cursor.fetchall()]
+            cursor.executemany(
+                "UPDATE items SET next_refresh_at = ? WHERE id = ?",
+                [(now + row['interval'], row['id']) for row in rows]
+            )
+            return rows
+    
     def get_chunks_by_item_id(self, item_id: int) -> List[Dict[str, Any]]:
         """Retrieve all chunks for a specific item."""
         with self.get_connection() as conn:
@@ -126,18 +712,155 @@ class Database:
             return [dict(row) for row in rows]
     
     def get_all_chunks(self) -> List[Dict[str, Any]]:
-        """Retrieve all chunks from all items."""
+        """
+        Retrieve all chunks from all items, including any stored embeddings.
+        
+        Chunks linked as near-duplicates of another chunk are left out.
+        """
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT c.*, i.source_type, i.url 
+                SELECT c.*, i.source_type, i.url, i.created_at AS item_created_at
                 FROM chunks c
                 JOIN items i ON c.item_id = i.id
+                WHERE c.duplicate_of IS NULL
                 ORDER BY c.id
             """)
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
     
+    def search_chunks(self, query: str, limit: int,
+                      search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        Full-text search over chunk text, best BM25 match first.
+        
+        Chunks linked as near-duplicates are searched too: they are not in the
+        vector index, so this is how their own text and items stay reachable.
+        
+        Returns chunk rows joined with their item's source_type, url and created_at.
+        """
+        match = build_fts_query(query)
+        if not self.fts_enabled or not match:
+            return []
+        
+        conditions = ["chunks_fts MATCH ?"]
+        params: List[Any] = [match]
+        if search_filter is not None:
+            if search_filter.source_type is not None:
+                conditions.append("i.source_type = ?")
+                params.append(search_filter.source_type)
+            if search_filter.item_ids is not None:
+                conditions.append(f"c.item_id IN ({', '.join('?' * len(search_filter.item_ids))})")
+                params.extend(search_filter.item_ids)
+            if search_filter.created_after is not None:
+                conditions.append("i.created_at >= ?")
+                params.append(format_db_timestamp(search_filter.created_after))
+            if search_filter.created_before is not None:
+                conditions.append("i.created_at < ?")
+                params.append(format_db_timestamp(search_filter.created_before))
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT c.id, c.item_id, c.chunk_text, c.chunk_index, c.duplicate_of, i.source_type,
+                       i.url, i.created_at, bm25(chunks_fts) AS rank
+                FROM chunks_fts
+                JOIN chunks c ON c.id = chunks_fts.rowid
+                JOIN items i ON c.item_id = i.id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY rank
+                LIMIT ?
+            """, (*params, limit))
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    def get_chunks_by_ids(self, chunk_ids: List[int]) -> List[Dict[str, Any]]:
+        """Retrieve chunks, with embeddings and item fields, by id."""
+        if not chunk_ids:
+            return []
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT c.*, i.source_type, i.url, i.created_at AS item_created_at
+                FROM chunks c
+                JOIN items i ON c.item_id = i.id
+                WHERE c.id IN ({', '.join('?' * len(chunk_ids))})
+                ORDER BY c.id
+            """, chunk_ids)
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    def find_chunks_by_band_keys(self, band_keys: List[int]) -> List[Dict[str, Any]]:
+        """Chunks sharing any LSH band key, with their signature and duplicate_of."""
+        rows = []
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Stay well under SQLite's bound parameter limit
+            for start in range(0, len(band_keys), 500):
+                batch = band_keys[start:start + 500]
+                cursor.execute(f"""
+                    SELECT l.band_key, l.chunk_id, s.signature, c.duplicate_of
+                    FROM chunk_lsh l
+                    JOIN chunk_signatures s ON s.chunk_id = l.chunk_id
+                    JOIN chunks c ON c.id = l.chunk_id
+                    WHERE l.band_key IN ({', '.join('?' * len(batch))})
+                """, batch)
+                rows.extend(dict(row) for row in cursor.fetchall())
+        return rows
+    
+    def promote_duplicates(self, chunk_ids: List[int]) -> List[int]:
+        """
+        Keep near-duplicates alive when the chunks they link to are about to be removed.
+        
+        For each chunk with duplicates outside `chunk_ids`, the oldest duplicate
+        takes over its embedding and becomes the original the others link to.
+        
+        Returns:
+            Ids of the promoted chunks
+        """
+        if not chunk_ids:
+            return []
+        
+        with self.get_connection() as conn:
+            return self._promote_duplicates(conn.cursor(), chunk_ids)
+    
+    def _promote_duplicates(self, cursor, chunk_ids: List[int]) -> List[int]:
+        """Promote duplicates of chunks about to be removed using an open cursor."""
+        removing = set(chunk_ids)
+        duplicates: Dict[int, List[int]] = {}
+        for start in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[start:start + 500]
+            cursor.execute(f"""
+                SELECT id, duplicate_of FROM chunks
+                WHERE duplicate_of IN ({', '.join('?' * len(batch))})
+                ORDER BY id
+            """, batch)
+            for row in cursor.fetchall():
+                if row['id'] not in removing:
+                    duplicates.setdefault(row['duplicate_of'], []).append(row['id'])
+        
+        promoted = []
+        for original, linked in duplicates.items():
+            successor = linked[0]
+            cursor.execute("""
+                UPDATE chunks
+                SET duplicate_of = NULL,
+                    embedding = (SELECT embedding FROM chunks WHERE id = :original),
+                    embedding_model = (SELECT embedding_model FROM chunks WHERE id = :original),
+                    embedding_dim = (SELECT embedding_dim FROM chunks WHERE id = :original)
+                WHERE id = :successor
+            """, {'original': original, 'successor': successor})
+            cursor.executemany(
+                "UPDATE chunks SET duplicate_of = ? WHERE id = ?",
+                [(successor, chunk_id) for chunk_id in linked[1:]]
+            )
+            promoted.append(successor)
+        
+        if promoted:
+            logger.info(f"Promoted {len(promoted)} near-duplicate chunks to originals")
+        return promoted
+    
     def delete_item(self, item_id: int) -> bool:
         """Delete an item and its associated chunks."""
         with self.get_connection() as conn:
@@ -148,5 +871,122 @@ class Database:
                 logger.info(f"Deleted item {item_id}")
             return deleted
 
+    def create_job(self, content: str, source_type: str, max_attempts: int, priority: int = 0,
+                   refresh_item_id: Optional[int] = None) -> int:
+        """
+        Queue an ingestion job and return its id; higher priority jobs are claimed first.
+        
+        With refresh_item_id the job re-fetches that URL item instead of ingesting content.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """INSERT INTO jobs (content, source_type, max_attempts, priority, refresh_item_id)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (content, source_type, max_attempts, priority, refresh_item_id)
+            )
+            return cursor.lastrowid
+    
+    def claim_next_job(self) -> Optional[Dict[str, Any]]:
+        """
+        Mark the oldest runnable queued job of the highest priority as running and return it.
+        
+        The status check in the UPDATE makes claims safe across threads;
+        a job taken by another worker in between is skipped.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            while True:
+                cursor.execute("""
+                    SELECT id FROM jobs
+                    WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP
+                    ORDER BY priority DESC, id
+                    LIMIT 1
+                """)
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                
+                cursor.execute("""
+                    UPDATE jobs
+                    SET status = 'running', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'queued'
+                """, (row['id'],))
+                if cursor.rowcount:
+                    cursor.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],))
+                    return dict(cursor.fetchone())
+    
+    def update_job_progress(self, job_id: int, chunks_embedded: int, chunks_total: int):
+        """Record how many of a job's chunks have been embedded."""
+        with self.get_connection() as conn:
+            conn.execute(
+                """UPDATE jobs SET chunks_embedded = ?, chunks_total = ?, updated_at = CURRENT_TIMESTAMP
+                   WHERE id = ?""",
+                (chunks_embedded, chunks_total, job_id)
+            )
+    
+    def complete_job(self, job_id: int, item_id: int):
+        """Mark a job as succeeded with the item it created."""
+        with self.get_connection() as conn:
+            conn.execute(
+                """UPDATE jobs SET status = 'succeeded', item_id = ?, error = NULL, updated_at = CURRENT_TIMESTAMP
+                   WHERE id = ?""",
+                (item_id, job_id)
+            )
+    
+    def fail_job(self, job_id: int, error: str, retry_delay: Optional[float] = None):
+        """
+        Record a failed attempt.
+        
+        With a retry delay the job is queued again to run after it;
+        otherwise it is marked as failed for good.
+        """
+        with self.get_connection() as conn:
+            if retry_delay is None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (error, job_id)
+                )
+            else:
+                conn.execute(
+                    """UPDATE jobs
+                       SET status = 'queued', error = ?, run_after = datetime('now', ?),
+                           updated_at = CURRENT_TIMESTAMP
+                       WHERE id = ?""",
+                    (error, f"+{retry_delay} seconds", job_id)
+                )
+    
+    def count_queued_jobs(self, priority: int) -> int:
+        """Number of jobs of a priority still waiting to run."""
+        with self.get_connection() as conn:
+            cursor = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND priority = ?",
+                (priority,)
+            )
+            return cursor.fetchone()[0]
+    
+    def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Retrieve an ingestion job by ID."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    
+    def requeue_interrupted_jobs(self) -> int:
+        """
+        Queue jobs left running by a previous process; returns how many.
+        
+        The interrupted attempt is not counted against the job.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE jobs
+                SET status = 'queued', attempts = MAX(attempts - 1, 0), updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'running'
+            """)
+            return cursor.rowcount
+
 # Global database instance
 db = Database()
@@ -0,0 +1,186 @@
+import hashlib
+import re
+import threading
+import zlib
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Any, Set
+from config import config
+from logger import logger
+from database import db
+from chunking import estimate_tokens
+
+WORD = re.compile(r'\w+')
+
+# MinHash permutations h(x) = (a * x + b) mod p over 32-bit shingle hashes
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+PERMUTATION_SEED = 1  # fixed, so signatures stay comparable with those stored
+
+@dataclass
+class Fingerprint:
+    """A chunk's MinHash signature, LSH band keys and, if any, the chunk it duplicates."""
+    signature: np.ndarray
+    band_keys: List[int]
+    duplicate_of: Optional[int] = None  # chunk id, or ~i for chunk i of the same batch
+    
+    @property
+    def is_duplicate(self) -> bool:
+        return self.duplicate_of is not None
+    
+    def as_row(self) -> Tuple[bytes, List[int], Optional[int]]:
+        """Form stored by the database layer."""
+        return self.signature.astype(np.uint32).tobytes(), self.band_keys, self.duplicate_of
+
+def lsh_parameters(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    Choose (bands, rows) with bands * rows = num_perm for a similarity threshold.
+    
+    Takes the most rows per band whose S-curve midpoint (1/bands)^(1/rows)
+    stays at or below the threshold, so true near-duplicates are almost
+    always candidates; candidates are then checked against the threshold.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+class ChunkDeduplicator:
+    """
+    Ingest-time near-duplicate detection for chunks.
+    
+    Each chunk gets a MinHash signature over its word shingles; signatures
+    are split into LSH bands whose hashes are persisted in SQLite next to
+    the chunks, so candidates come from an indexed lookup rather than a
+    scan. A candidate whose estimated Jaccard similarity reaches
+    DEDUP_THRESHOLD makes the chunk a duplicate, which is then either
+    dropped (skip) or stored linked to the original (link) - either way
+    it is never embedded or added to the vector index. Linked duplicates
+    stay in full-text search, so their own text can still be retrieved.
+    """
+    
+    def __init__(self, mode: str = None, threshold: float = None, num_perm: int = None,
+                 shingle_words: int = None):
+        self.mode = (mode or config.DEDUP_MODE).lower()
+        self.threshold = threshold if threshold is not None else config.DEDUP_THRESHOLD
+        self.num_perm = num_perm or config.DEDUP_NUM_PERM
+        self.shingle_words = shingle_words or config.DEDUP_SHINGLE_WORDS
+        self.bands, self.rows = lsh_parameters(self.num_perm, self.threshold)
+        
+        generator = np.random.RandomState(PERMUTATION_SEED)
+        self._a = generator.randint(1, MERSENNE_PRIME, self.num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, MERSENNE_PRIME, self.num_perm, dtype=np.uint64)
+        
+        self._lock = threading.Lock()
+        self.chunks_checked = 0
+        self.chunks_saved = 0
+        self.tokens_saved = 0
+        
+        if self.mode not in ("link", "skip", "off"):
+            logger.warning(f"Unknown DEDUP_MODE '{self.mode}'; near-duplicate detection off")
+            self.mode = "off"
+    
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+    
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of a text's lowercased word shingles."""
+        words = WORD.findall(text.lower())
+        size = min(self.shingle_words, len(words))
+        shingles = {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)} if words else set()
+        if not shingles:
+            return np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+        
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        # uint64 products wrap; the result is still a usable hash family
+        permuted = (hashes[:, None] * self._a + self._b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0)
+    
+    def band_keys(self, signature: np.ndarray) -> List[int]:
+        """One signed 64-bit key per LSH band, unique across bands."""
+        values = signature.astype(np.uint32)
+        keys = []
+        for band in range(self.bands):
+            digest = hashlib.blake2b(
+                band.to_bytes(2, 'little') + values[band * self.rows:(band + 1) * self.rows].tobytes(),
+                digest_size=8
+            ).digest()
+            keys.append(int.from_bytes(digest, 'little', signed=True))
+        return keys
+    
+    @staticmethod
+    def similarity(first: np.ndarray, second: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two signatures."""
+        return float(np.mean(first == second))
+    
+    def fingerprint(self, chunks: List[str], exclude: Optional[Set[int]] = None) -> List[Fingerprint]:
+        """
+        Fingerprint chunks and mark near-duplicates of stored chunks or of
+        earlier chunks in the same list. Blocks on SQLite; run it in a thread.
+        
+        Stored chunks in `exclude`, and duplicates linked to them, are not
+        candidates (a refresh excludes the chunks it is about to replace).
+        """
+        exclude = exclude or set()
+        fingerprints = []
+        for text in chunks:
+            signature = self.signature(text)
+            fingerprints.append(Fingerprint(signature, self.band_keys(signature)))
+        
+        # Stored candidates sharing any band, as band key -> [(canonical id, signature)]
+        stored: Dict[int, List[Tuple[int, np.ndarray]]] = {}
+        all_keys = list({key for fingerprint in fingerprints for key in fingerprint.band_keys})
+        for row in db.find_chunks_by_band_keys(all_keys):
+            canonical = row['duplicate_of'] if row['duplicate_of'] is not None else row['chunk_id']
+            if row['chunk_id'] in exclude or canonical in exclude:
+                continue
+            signature = np.frombuffer(row['signature'], dtype=np.uint32).astype(np.uint64)
+            stored.setdefault(row['band_key'], []).append((canonical, signature))
+        
+        # Earlier original chunks of this batch, as band key -> [~position]
+        batch: Dict[int, List[int]] = {}
+        saved_tokens = 0
+        for position, fingerprint in enumerate(fingerprints):
+            best_similarity = 0.0
+            for key in fingerprint.band_keys:
+                candidates = stored.get(key, []) + [
+                    (~other, fingerprints[other].signature) for other in batch.get(key, [])
+                ]
+                for canonical, signature in candidates:
+                    similarity = self.similarity(fingerprint.signature, signature)
+                    if similarity >= self.threshold and similarity > best_similarity:
+                        best_similarity = similarity
+                        fingerprint.duplicate_of = canonical
+            
+            if fingerprint.is_duplicate:
+                saved_tokens += estimate_tokens(chunks[position])
+            else:
+                for key in fingerprint.band_keys:
+                    batch.setdefault(key, []).append(position)
+        
+        duplicates = sum(fingerprint.is_duplicate for fingerprint in fingerprints)
+        with self._lock:
+            self.chunks_checked += len(chunks)
+            self.chunks_saved += duplicates
+            self.tokens_saved += saved_tokens
+        if duplicates:
+            logger.info(f"Found {duplicates} near-duplicate chunks out of {len(chunks)}")
+        return fingerprints
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'mode': self.mode,
+            'threshold': self.threshold,
+            'chunks_checked': self.chunks_checked,
+            'chunks_saved': self.chunks_saved,
+            'tokens_saved': self.tokens_saved
+        }
+
+# Global deduplicator instance
+chunk_deduplicator = ChunkDeduplicator()
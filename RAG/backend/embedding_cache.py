@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from config import config
+from logger import logger
+from database import ConnectionPool, encode_embedding, decode_embedding
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache.
+    
+    Entries are keyed by (deployment, sha256 of text). Lookups hit an
+    in-memory LRU first and fall back to an optional SQLite file, so
+    identical chunks and repeated queries never reach Azure twice.
+    """
+    
+    def __init__(self, max_entries: int = None, db_path: Optional[str] = None):
+        self.max_entries = max_entries if max_entries is not None else config.EMBEDDING_CACHE_SIZE
+        self.db_path = db_path if db_path is not None else config.EMBEDDING_CACHE_PATH
+        self._memory: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        if self.db_path:
+            self._pool = ConnectionPool(self.db_path)
+            self.init_db()
+    
+    def get_connection(self):
+        """Context manager for pooled cache database connections."""
+        return self._pool.connection()
+    
+    def init_db(self):
+        """Initialize the on-disk cache schema."""
+        with self.get_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    deployment TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    PRIMARY KEY (deployment, text_hash)
+                )
+            """)
+        logger.info(f"Embedding cache persisted to {self.db_path}")
+    
+    @staticmethod
+    def key(deployment: str, text: str) -> Tuple[str, str]:
+        """Build the cache key for a text embedded by a deployment."""
+        return deployment, hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def _remember(self, key: Tuple[str, str], embedding: np.ndarray):
+        """Insert into the in-memory tier, evicting least recently used entries."""
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def get_many(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], np.ndarray]:
+        """Look up embeddings for the given keys; missing keys are omitted."""
+        found = {}
+        missing = []
+        
+        with self._lock:
+            for key in keys:
+                embedding = self._memory.get(key)
+                if embedding is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = embedding
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+        
+        missing = list(dict.fromkeys(missing))
+        if missing and self.db_path:
+            with self.get_connection() as conn:
+                for deployment, text_hash in missing:
+                    row = conn.execute(
+                        "SELECT embedding FROM embedding_cache WHERE deployment = ? AND text_hash = ?",
+                        (deployment, text_hash)
+                    ).fetchone()
+                    if row:
+                        found[(deployment, text_hash)] = decode_embedding(row[0])
+            
+            with self._lock:
+                for key in missing:
+                    if key in found:
+                        self._remember(key, found[key])
+                        self.disk_hits += 1
+        
+        with self._lock:
+            self.misses += sum(1 for key in missing if key not in found)
+        return found
+    
+    def put_many(self, entries: Dict[Tuple[str, str], Sequence[float]]):
+        """Store freshly generated embeddings in both tiers."""
+        if not entries:
+            return
+        
+        vectors = {key: np.asarray(embedding, dtype=np.float32) for key, embedding in entries.items()}
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+        
+        if self.db_path:
+            with self.get_connection() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (deployment, text_hash, embedding) VALUES (?, ?, ?)",
+                    [
+                        (deployment, text_hash, encode_embedding(vector))
+                        for (deployment, text_hash), vector in vectors.items()
+                    ]
+                )
+    
+    async def get_many_async(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], np.ndarray]:
+        """Async get_many that keeps on-disk lookups off the event loop."""
+        if not self.db_path:
+            return self.get_many(keys)
+        return await asyncio.to_thread(self.get_many, keys)
+    
+    async def put_many_async(self, entries: Dict[Tuple[str, str], Sequence[float]]):
+        """Async put_many that keeps on-disk writes off the event loop."""
+        if not self.db_path:
+            self.put_many(entries)
+            return
+        await asyncio.to_thread(self.put_many, entries)
+    
+    def stats(self) -> Dict[str, int]:
+        """Return cache hit/miss counters."""
+        with self._lock:
+            return {
+                'entries': len(self._memory),
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses
+            }
+
+# Global embedding cache instance
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Union
+
+# SQLite CURRENT_TIMESTAMP format (UTC, no zone suffix)
+DB_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def to_utc(value: datetime) -> datetime:
+    """Treat naive datetimes as UTC, like SQLite's CURRENT_TIMESTAMP."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def to_timestamp(value: Union[str, datetime, None]) -> Optional[float]:
+    """Convert a stored created_at string or a datetime to epoch seconds."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return to_utc(value).timestamp()
+
+def format_db_timestamp(value: datetime) -> str:
+    """Format a datetime for comparison with stored created_at values."""
+    return to_utc(value).strftime(DB_TIMESTAMP_FORMAT)
+
+@dataclass
+class SearchFilter:
+    """
+    Restricts retrieval to a subset of chunks.
+    
+    Every field is optional and set fields are combined with AND;
+    created_after is inclusive and created_before is exclusive.
+    """
+    source_type: Optional[str] = None
+    item_ids: Optional[List[int]] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    
+    def is_empty(self) -> bool:
+        return (self.source_type is None and self.item_ids is None
+                and self.created_after is None and self.created_before is None)
+    
+    def cache_key(self) -> Dict[str, Any]:
+        """JSON-serializable form identifying this filter."""
+        return {
+            'source_type': self.source_type,
+            'item_ids': sorted(set(self.item_ids)) if self.item_ids is not None else None,
+            'created_after': to_timestamp(self.created_after),
+            'created_before': to_timestamp(self.created_before)
+        }
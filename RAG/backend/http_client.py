@@ -0,0 +1,182 @@
+import asyncio
+import codecs
+import importlib.util
+import re
+import httpx
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Optional, Dict, List
+from config import config
+from logger import logger
+
+# httpx needs h2 for HTTP/2; only check that it is installed
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w.:-]+)""", re.IGNORECASE)
+
+class ContentRejected(ValueError):
+    """A fetched URL's content type or size is not acceptable for ingestion."""
+
+def sniff_encoding(head: bytes) -> str:
+    """Find a <meta charset> in the start of a document, defaulting to UTF-8."""
+    match = META_CHARSET.search(head)
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode('ascii')).name
+        except LookupError:
+            pass
+    return 'utf-8'
+
+@dataclass
+class FetchedPage:
+    """A downloaded page and the validators for fetching it conditionally next time."""
+    text: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    not_modified: bool = False  # 304 response; text is empty
+
+class URLFetcher:
+    """
+    Shared HTTP client for URL ingestion.
+    
+    One pooled httpx.AsyncClient keeps connections alive across fetches
+    (negotiating HTTP/2 when h2 is installed), and fetches are capped both
+    globally and per host so bulk imports don't hammer a single site.
+    
+    Bodies are streamed: the content type is checked from the headers before
+    anything is downloaded, and reading stops at FETCH_MAX_BYTES.
+    """
+    
+    USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._global_slots: Optional[asyncio.Semaphore] = None
+        
+        # host -> [semaphore, fetches holding or waiting for it]
+        self._host_slots: Dict[str, List] = {}
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The pooled client, created on first use inside the event loop."""
+        if self._client is None:
+            http2 = config.FETCH_HTTP2 and HTTP2_AVAILABLE
+            self._client = httpx.AsyncClient(
+                http2=http2,
+                follow_redirects=True,
+                headers={'User-Agent': self.USER_AGENT},
+                timeout=httpx.Timeout(
+                    config.FETCH_READ_TIMEOUT,
+                    connect=config.FETCH_CONNECT_TIMEOUT
+                ),
+                limits=httpx.Limits(
+                    max_connections=config.FETCH_MAX_CONCURRENCY,
+                    max_keepalive_connections=config.FETCH_MAX_CONCURRENCY
+                )
+            )
+            self._global_slots = asyncio.Semaphore(config.FETCH_MAX_CONCURRENCY)
+            logger.info(f"URL fetch client ready (HTTP/2 {'on' if http2 else 'off'})")
+        return self._client
+    
+    @asynccontextmanager
+    async def _host_slot(self, host: str):
+        """Hold one of the host's FETCH_MAX_PER_HOST slots."""
+        entry = self._host_slots.get(host)
+        if entry is None:
+            entry = self._host_slots[host] = [asyncio.Semaphore(config.FETCH_MAX_PER_HOST), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            # Forget idle hosts so the map doesn't grow with every site ever fetched
+            entry[1] -= 1
+            if not entry[1]:
+                del self._host_slots[host]
+    
+    @asynccontextmanager
+    async def stream(self, url: str, headers: Optional[Dict[str, str]] = None):
+        """
+        Open a streaming GET through the shared client; the body is not read yet.
+        
+        A 304 answer to a conditional request is yielded like a success.
+        
+        Raises:
+            httpx.HTTPError: On connection errors, timeouts or error statuses
+        """
+        client = self.client
+        
+        # Wait for the host first so a slow site can't tie up global slots
+        async with self._host_slot(httpx.URL(url).host):
+            async with self._global_slots:
+                async with client.stream("GET", url, headers=headers) as response:
+                    if response.status_code != 304:
+                        response.raise_for_status()
+                    yield response
+    
+    async def fetch_page(self, url: str, etag: Optional[str] = None,
+                         last_modified: Optional[str] = None) -> FetchedPage:
+        """
+        Download a page as text, decoding it incrementally as it streams in.
+        
+        Passing the validators from a previous fetch makes the request
+        conditional; an unchanged page comes back with not_modified set.
+        
+        Raises:
+            ContentRejected: For content types not in FETCH_ALLOWED_CONTENT_TYPES
+                or bodies larger than FETCH_MAX_BYTES
+            httpx.HTTPError: On connection errors, timeouts or error statuses
+        """
+        max_bytes = config.FETCH_MAX_BYTES
+        
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        
+        async with self.stream(url, headers) as response:
+            if response.status_code == 304:
+                return FetchedPage(
+                    "",
+                    response.headers.get('etag', etag),
+                    response.headers.get('last-modified', last_modified),
+                    not_modified=True
+                )
+            
+            # Fail fast on binaries and oversized pages, before reading the body
+            mime_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+            if mime_type and mime_type not in config.FETCH_ALLOWED_CONTENT_TYPES:
+                raise ContentRejected(f"Unsupported content type: {mime_type}")
+            
+            declared = response.headers.get('content-length')
+            if declared and declared.isdigit() and int(declared) > max_bytes:
+                raise ContentRejected(f"Page too large ({int(declared)} bytes, max {max_bytes})")
+            
+            decoder = None
+            parts = []
+            received = 0
+            async for data in response.aiter_bytes():
+                received += len(data)
+                if received > max_bytes:
+                    raise ContentRejected(f"Page too large (over {max_bytes} bytes)")
+                
+                # Pick the encoding from the header, or from the first bytes of the page
+                if decoder is None:
+                    encoding = response.charset_encoding or sniff_encoding(data[:2048])
+                    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+                parts.append(decoder.decode(data))
+            
+            if decoder is not None:
+                parts.append(decoder.decode(b'', final=True))
+            return FetchedPage(''.join(parts), response.headers.get('etag'), response.headers.get('last-modified'))
+    
+    async def aclose(self):
+        """Close pooled connections (on shutdown)."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._global_slots = None
+
+# Global URL fetcher instance
+url_fetcher = URLFetcher()
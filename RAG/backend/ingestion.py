@@ -1,64 +1,195 @@
-import requests
+import asyncio
+import dataclasses
+import httpx
 from bs4 import BeautifulSoup
-from typing import Optional, Tuple
+from dataclasses import dataclass
+from typing import Optional, Tuple, List, Dict, Any, Callable, Awaitable, Iterable
+from config import config
 from logger import logger
+from http_client import url_fetcher, ContentRejected, FetchedPage
+from chunking import chunk_text
+
+# Elements whose text is never article content
+SKIPPED_TAGS = ('script', 'style', 'nav', 'footer', 'header')
+
+# Elements that start a new block of text (a paragraph for the chunker)
+BLOCK_TAGS = (
+    'address', 'article', 'aside', 'blockquote', 'dd', 'details', 'div', 'dl', 'dt', 'fieldset',
+    'figcaption', 'figure', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'main', 'ol', 'p',
+    'pre', 'section', 'summary', 'table', 'tr', 'ul'
+)
+
+# Headings become markdown-style "## Title" blocks so chunks break at them
+HEADING_PREFIXES = {f'h{level}': '#' * level + ' ' for level in range(1, 7)}
+
+# Placed around block elements before extracting text; never left in the output
+BLOCK_MARK = '\ue000'  # private use code point, not found in real page text
+
+def normalize_blocks(text: str) -> str:
+    """
+    Turn marked-up extracted text into blank-line separated blocks.
+    
+    Whitespace is collapsed within each block (source line breaks inside a
+    paragraph are just formatting); empty blocks and empty headings are dropped.
+    """
+    blocks = (' '.join(part.split()) for part in text.split(BLOCK_MARK))
+    return '\n\n'.join(block for block in blocks if block.strip('# '))
+
+class HTMLExtractor:
+    """Base class for HTML-to-text extractors."""
+    
+    name = "base"
+    
+    def extract(self, html: str) -> str:
+        """Return the readable text of an HTML document."""
+        raise NotImplementedError
+
+class BeautifulSoupExtractor(HTMLExtractor):
+    """Pure-Python extraction with BeautifulSoup's html.parser (always available)."""
+    
+    name = "html.parser"
+    
+    def extract(self, html: str) -> str:
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # Remove script and style elements
+        for element in soup(SKIPPED_TAGS):
+            element.decompose()
+        
+        for element in soup(BLOCK_TAGS):
+            element.insert_before(BLOCK_MARK + HEADING_PREFIXES.get(element.name, ''))
+            element.insert_after(BLOCK_MARK)
+        
+        return normalize_blocks(soup.get_text(separator=' '))
+
+class LxmlExtractor(HTMLExtractor):
+    """C-backed extraction with lxml (requires lxml)."""
+    
+    name = "lxml"
+    
+    def __init__(self):
+        import lxml.etree
+        import lxml.html
+        self._etree = lxml.etree
+        self._html = lxml.html
+        
+        # Parse from UTF-8 bytes: lxml refuses str input that carries an XML encoding declaration
+        self._parser = lxml.html.HTMLParser(encoding='utf-8')
+    
+    def extract(self, html: str) -> str:
+        try:
+            document = self._html.fromstring(html.encode('utf-8'), parser=self._parser)
+        except self._etree.ParserError:
+            return ""  # Empty document
+        
+        self._etree.strip_elements(document, *SKIPPED_TAGS, with_tail=False)
+        for element in document.iter(*BLOCK_TAGS):
+            element.text = BLOCK_MARK + HEADING_PREFIXES.get(element.tag, '') + (element.text or '')
+            element.tail = BLOCK_MARK + (element.tail or '')
+        return normalize_blocks(' '.join(document.itertext()))
+
+class SelectolaxExtractor(HTMLExtractor):
+    """C-backed extraction with selectolax's lexbor parser (requires selectolax)."""
+    
+    name = "selectolax"
+    
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self._parser_class = LexborHTMLParser
+    
+    def extract(self, html: str) -> str:
+        tree = self._parser_class(html)
+        tree.strip_tags(list(SKIPPED_TAGS))
+        if tree.root is None:
+            return ""
+        for node in tree.css(', '.join(BLOCK_TAGS)):
+            node.insert_before(BLOCK_MARK + HEADING_PREFIXES.get(node.tag, ''))
+            node.insert_after(BLOCK_MARK)
+        return normalize_blocks(tree.root.text(separator=' '))
+
+HTML_EXTRACTORS = {
+    BeautifulSoupExtractor.name: BeautifulSoupExtractor,
+    LxmlExtractor.name: LxmlExtractor,
+    SelectolaxExtractor.name: SelectolaxExtractor
+}
+
+def create_extractor(extractor_type: Optional[str] = None) -> HTMLExtractor:
+    """
+    Build the HTML extractor named by HTML_EXTRACTOR.
+    
+    Falls back to html.parser if the type is unknown or its library is missing.
+    """
+    extractor_type = (extractor_type or config.HTML_EXTRACTOR).lower()
+    extractor_class = HTML_EXTRACTORS.get(extractor_type)
+    
+    if extractor_class is None:
+        logger.warning(f"Unknown HTML_EXTRACTOR '{extractor_type}'; using html.parser")
+        return BeautifulSoupExtractor()
+    
+    try:
+        extractor = extractor_class()
+    except ImportError as e:
+        logger.warning(f"HTML extractor '{extractor_type}' unavailable ({e}); using html.parser")
+        return BeautifulSoupExtractor()
+    
+    logger.info(f"Using {extractor.name} HTML extractor")
+    return extractor
 
 class ContentIngestion:
     """Handles content ingestion from notes and URLs."""
     
-    @staticmethod
-    def extract_url_content(url: str) -> Tuple[bool, str, Optional[str]]:
+    def __init__(self):
+        self.extractor = create_extractor()
+    
+    def parse_html(self, html: str) -> str:
+        """Extract readable text from an HTML document."""
+        return self.extractor.extract(html)
+    
+    async def extract_url_content(self, url: str, etag: Optional[str] = None,
+                                  last_modified: Optional[str] = None) -> Tuple[bool, Optional[FetchedPage], Optional[str]]:
         """
         Extract text content from a URL.
         
+        With the validators of a previous fetch the request is conditional,
+        and an unchanged page is returned with not_modified set and no text.
+        
         Returns:
-            Tuple of (success, content, error_message)
+            Tuple of (success, page with extracted text, error_message)
         """
         try:
-            # Set headers to mimic a browser
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            
-            # Fetch the URL with timeout
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            # Parse HTML
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(['script', 'style', 'nav', 'footer', 'header']):
-                script.decompose()
-            
-            # Get text content
-            text = soup.get_text(separator=' ', strip=True)
+            # Streamed over pooled keep-alive connections, with type and size limits
+            page = await url_fetcher.fetch_page(url, etag, last_modified)
+            if page.not_modified:
+                logger.info(f"{url} not modified since last fetch")
+                return True, page, None
             
-            # Clean up whitespace
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = ' '.join(chunk for chunk in chunks if chunk)
+            # Parsing is CPU-bound; keep it off the event loop
+            text = await asyncio.to_thread(self.parse_html, page.text)
             
             if not text:
-                return False, "", "No text content found at URL"
+                return False, None, "No text content found at URL"
             
             logger.info(f"Successfully extracted {len(text)} characters from {url}")
-            return True, text, None
+            return True, dataclasses.replace(page, text=text), None
+        
+        except ContentRejected as e:
+            logger.warning(f"Rejected {url}: {e}")
+            return False, None, str(e)
             
-        except requests.Timeout:
+        except httpx.TimeoutException:
             error = "Request timed out"
             logger.error(f"Timeout fetching {url}")
-            return False, "", error
+            return False, None, error
             
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             error = f"Failed to fetch URL: {str(e)}"
             logger.error(f"Error fetching {url}: {e}")
-            return False, "", error
+            return False, None, error
             
         except Exception as e:
             error = f"Error parsing content: {str(e)}"
             logger.error(f"Error parsing {url}: {e}")
-            return False, "", error
+            return False, None, error
     
     @staticmethod
     def validate_note(content: str) -> Tuple[bool, Optional[str]]:
@@ -75,103 +206,451 @@ class ContentIngestion:
             return False, "Note content too long (max 50,000 characters)"
         
         return True, None
-    
-    @staticmethod
-    def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50):
-        """
-        Split text into chunks with overlap.
-        
-        Args:
-            text: Text to chunk
-            chunk_size: Number of words per chunk
-            overlap: Number of words to overlap between chunks
-            
-        Returns:
-            List of text chunks
-        """
-        # Simple word-based chunking
-        words = text.split()
-        chunks = []
-        
-        if len(words) <= chunk_size:
-            return [text]
-        
-        start = 0
-        while start < len(words):
-            end = start + chunk_size
-            chunk_words = words[start:end]
-            chunk = ' '.join(chunk_words)
-            chunks.append(chunk)
-            
-            # Move start position with overlap
-            start = end - overlap
-            
-            # Prevent infinite loop
-            if start >= len(words):
-                break
-        
-        logger.info(f"Split text into {len(chunks)} chunks")
-        return chunks
 
 
 # Global ingestion instance
 content_ingestion = ContentIngestion()
 
-async def process_content(content: str, source_type: str) -> int:
+# Items with a refresh in flight, so concurrent refreshes can't interleave their diffs
+_refreshing = set()
+
+@dataclass
+class ResolvedContent:
+    """Text ready to chunk, plus where it came from."""
+    text: str
+    url: Optional[str] = None  # None for notes
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+async def resolve_content(content: str, source_type: str) -> ResolvedContent:
     """
-    Process and ingest content into the knowledge base.
+    Fetch a URL's text or validate a note.
     
-    Args:
-        content: The content to ingest (note text or URL)
-        source_type: Type of content ('note' or 'url')
+    Raises:
+        ValueError: If the URL can't be fetched or the note is invalid
+    """
+    if source_type == "url":
+        success, page, error = await content_ingestion.extract_url_content(content)
+        if not success:
+            raise ValueError(f"Failed to extract URL content: {error}")
+        return ResolvedContent(page.text, content, page.etag, page.last_modified)
+    
+    is_valid, error = content_ingestion.validate_note(content)
+    if not is_valid:
+        raise ValueError(f"Invalid note content: {error}")
+    return ResolvedContent(content)
+
+def diff_chunks(existing: List[Dict[str, Any]],
+                chunks: Iterable[str]) -> Tuple[List[Tuple[int, int]], List[Tuple[int, str]], List[int]]:
+    """
+    Match new chunks against an item's stored chunk rows by text.
+    
+    Chunks are consumed one at a time, so only the text of changed chunks
+    is kept when given a chunk_text generator.
+    
+    Returns:
+        Tuple of (kept, added, removed): (chunk_id, new_index) for every
+        stored chunk that is still present, (index, text) for chunks that
+        need embedding, and the ids of stored chunks that are gone
+    """
+    # Text -> stored ids, so repeated chunks are matched one for one
+    available: Dict[str, List[int]] = {}
+    for row in sorted(existing, key=lambda row: row['chunk_index']):
+        available.setdefault(row['chunk_text'], []).append(row['id'])
+    
+    kept = []
+    added = []
+    for index, chunk in enumerate(chunks):
+        ids = available.get(chunk)
+        if ids:
+            kept.append((ids.pop(0), index))
+        else:
+            added.append((index, chunk))
+    
+    removed = [chunk_id for ids in available.values() for chunk_id in ids]
+    return kept, added, removed
+
+async def dedupe_chunks(chunks: List[str], exclude: Optional[set] = None) -> Tuple[List[int], Optional[list]]:
+    """
+    Fingerprint chunks for near-duplicate detection.
+    
+    In skip mode duplicates are left out; in link mode they are kept,
+    marked by their fingerprint. Stored chunks in `exclude` are not
+    matched against.
     
     Returns:
-        item_id: ID of the created item
+        Tuple of (positions of the chunks to store, their fingerprints);
+        fingerprints is None when detection is off
     """
     from database import db
+    from dedup import chunk_deduplicator
+    
+    if not chunk_deduplicator.enabled or not chunks:
+        return list(range(len(chunks))), None
+    
+    fingerprints = await db.run_in_thread(chunk_deduplicator.fingerprint, chunks, exclude)
+    if chunk_deduplicator.mode == "skip":
+        originals = [i for i, fingerprint in enumerate(fingerprints) if not fingerprint.is_duplicate]
+        return originals, [fingerprints[i] for i in originals]
+    return list(range(len(chunks))), fingerprints
+
+def fingerprint_rows(fingerprints: Optional[list]) -> Optional[List[Tuple[bytes, List[int], Optional[int]]]]:
+    """Fingerprints in the form the database stores."""
+    return [fingerprint.as_row() for fingerprint in fingerprints] if fingerprints else None
+
+async def embed_originals(chunks: List[str], fingerprints: Optional[list],
+                          on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+                          ) -> List[Optional[List[float]]]:
+    """Embed every chunk except linked duplicates, which get None."""
     from vector_store import vector_store
     
-    # Extract/validate content based on type
-    if source_type == "url":
-        success, extracted_content, error = content_ingestion.extract_url_content(content)
-        if not success:
-            raise ValueError(f"Failed to extract URL content: {error}")
-        final_content = extracted_content
-        url = content
-    else:  # note
-        is_valid, error = content_ingestion.validate_note(content)
-        if not is_valid:
-            raise ValueError(f"Invalid note content: {error}")
-        final_content = content
-        url = None
-    
-    # Insert item into database
-    item_id = db.insert_item(
-        content=final_content,
-        source_type=source_type,
-        url=url
+    originals = [
+        i for i in range(len(chunks))
+        if fingerprints is None or not fingerprints[i].is_duplicate
+    ]
+    embedded = await vector_store.generate_embeddings([chunks[i] for i in originals], on_progress)
+    
+    embeddings: List[Optional[List[float]]] = [None] * len(chunks)
+    for i, embedding in zip(originals, embedded):
+        embeddings[i] = embedding
+    return embeddings
+
+async def index_chunks(chunks: List[str], chunk_metadatas: List[Dict[str, Any]],
+                       embeddings: List[Optional[List[float]]]):
+    """Add chunks to the vector store, leaving out linked duplicates."""
+    from vector_store import vector_store
+    
+    originals = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+    if originals:
+        await vector_store.add_chunks(
+            [chunks[i] for i in originals],
+            [chunk_metadatas[i] for i in originals],
+            [embeddings[i] for i in originals]
+        )
+
+async def promote_duplicates(chunk_ids: List[int]):
+    """
+    Before chunks are removed, make one of each one's linked near-duplicates
+    the new original and add it to the vector store.
+    """
+    from database import db
+    
+    await index_promoted(await db.run_in_thread(db.promote_duplicates, chunk_ids))
+
+async def index_promoted(promoted: List[int]):
+    """Add chunks promoted from near-duplicates to originals to the vector store."""
+    from database import db, decode_embedding
+    from vector_store import vector_store
+    
+    rows = [
+        row for row in await db.run_in_thread(db.get_chunks_by_ids, promoted)
+        if row['embedding'] is not None
+    ]
+    if not rows:
+        return
+    
+    await vector_store.add_chunks(
+        [row['chunk_text'] for row in rows],
+        [
+            {
+                'chunk_id': row['id'],
+                'item_id': row['item_id'],
+                'chunk_index': row['chunk_index'],
+                'source_type': row['source_type'],
+                'url': row['url'],
+                'created_at': row['item_created_at']
+            }
+            for row in rows
+        ],
+        [decode_embedding(row['embedding']) for row in rows]
     )
+
+async def refresh_url_item(item_id: int) -> Dict[str, Any]:
+    """
+    Re-fetch a URL item and re-ingest only what changed.
     
-    # Chunk the content
-    chunks = content_ingestion.chunk_text(final_content)
-    logger.info(f"Split text into {len(chunks)} chunks")
+    The fetch is conditional on the stored ETag/Last-Modified. If the page
+    did change, its new chunks are diffed against the stored ones: only new
+    chunks are embedded, removed ones are deleted and tombstoned in the
+    vector store, and unchanged ones keep their rows and embeddings.
+    
+    Returns:
+        Dict with item_id, status ('not_modified', 'unchanged' or 'updated')
+        and chunks_added / chunks_removed / chunks_unchanged counts
+    
+    Raises:
+        LookupError: If the item doesn't exist or isn't a URL item
+        ValueError: If the URL can't be fetched or a refresh is already running
+    """
+    from database import db, content_hash
+    from vector_store import vector_store
+    
+    item = await db.run_in_thread(db.get_item_by_id, item_id)
+    if item is None or item['source_type'] != 'url' or not item['url']:
+        raise LookupError(f"URL item {item_id} not found")
+    
+    if item_id in _refreshing:
+        raise ValueError(f"Item {item_id} is already being refreshed")
+    _refreshing.add(item_id)
     
-    # Process each chunk
-    for i, chunk_text in enumerate(chunks):
-        # Insert chunk into database
-        chunk_id = db.insert_chunk(
-            item_id=item_id,
-            chunk_text=chunk_text,
-            chunk_index=i
+    try:
+        url = item['url']
+        success, page, error = await content_ingestion.extract_url_content(
+            url, item['etag'], item['last_modified']
         )
+        if not success:
+            raise ValueError(f"Failed to extract URL content: {error}")
+        
+        existing = await db.run_in_thread(db.get_chunks_by_item_id, item_id)
+        result = {
+            'item_id': item_id,
+            'status': 'not_modified',
+            'chunks_added': 0,
+            'chunks_removed': 0,
+            'chunks_unchanged': len(existing)
+        }
+        
+        # Rows stored before hashing was added have no content_hash yet
+        stored_hash = item['content_hash'] or content_hash(item['content'])
+        if page.not_modified or content_hash(page.text) == stored_hash:
+            await db.run_in_thread(db.mark_item_fetched, item_id, page.etag, page.last_modified)
+            if not page.not_modified:
+                result['status'] = 'unchanged'
+            logger.info(f"Refreshed item {item_id}: {result['status']}")
+            return result
+        
+        kept, added, removed = diff_chunks(existing, chunk_text(page.text))
+        
+        # A changed chunk can resemble the version it replaces; don't match against those
+        stored, fingerprints = await dedupe_chunks([chunk for _, chunk in added], set(removed))
+        added = [added[i] for i in stored]
+        added_texts = [chunk for _, chunk in added]
+        
+        embeddings = await embed_originals(added_texts, fingerprints)
+        
+        previous_indexes = {row['id']: row['chunk_index'] for row in existing}
+        reindexed = [(chunk_id, index) for chunk_id, index in kept if previous_indexes[chunk_id] != index]
+        
+        # Duplicates elsewhere that link to removed chunks are promoted in the same transaction
+        added_ids, promoted = await db.run_in_thread(
+            db.update_item_content,
+            item_id,
+            page.text,
+            page.etag,
+            page.last_modified,
+            reindexed,
+            added,
+            embeddings,
+            removed,
+            config.AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+            fingerprint_rows(fingerprints)
+        )
+        
+        vector_store.remove_chunks(removed)
+        vector_store.update_chunk_indexes(reindexed)
+        await index_promoted(promoted)
+        if added_ids:
+            chunk_metadatas = build_chunk_metadatas(item_id, added_ids, 'url', url, item['created_at'])
+            for metadata, (index, _) in zip(chunk_metadatas, added):
+                metadata['chunk_index'] = index
+            await index_chunks(added_texts, chunk_metadatas, embeddings)
         
-        # Add to vector store
-        chunk_metadata = {
+        result.update(
+            status='updated',
+            chunks_added=len(added),
+            chunks_removed=len(removed),
+            chunks_unchanged=len(kept)
+        )
+        logger.info(
+            f"Refreshed item {item_id}: {len(added)} chunks embedded, "
+            f"{len(removed)} removed, {len(kept)} unchanged"
+        )
+        return result
+    
+    finally:
+        _refreshing.discard(item_id)
+
+def build_chunk_metadatas(item_id: int, chunk_ids: List[int], source_type: str,
+                          url: Optional[str], created_at: str) -> List[Dict[str, Any]]:
+    """Vector store metadata for an item's chunks, in chunk order."""
+    return [
+        {
             'chunk_id': chunk_id,
             'item_id': item_id,
-            'chunk_index': i
+            'chunk_index': i,
+            'source_type': source_type,
+            'url': url,
+            'created_at': created_at
         }
-        vector_store.add_chunk(chunk_text, chunk_metadata)
+        for i, chunk_id in enumerate(chunk_ids)
+    ]
+
+async def process_content(content: str, source_type: str,
+                          on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None) -> int:
+    """
+    Process and ingest content into the knowledge base.
+    
+    Args:
+        content: The content to ingest (note text or URL)
+        source_type: Type of content ('note' or 'url')
+        on_progress: Awaited with (chunks_embedded, total_chunks) while embedding
+    
+    A URL that is already in the knowledge base is refreshed in place
+    rather than ingested again.
+    
+    Returns:
+        item_id: ID of the created (or refreshed) item
+    """
+    from database import db
+    
+    if source_type == "url":
+        existing = await db.run_in_thread(db.get_item_by_url, content)
+        if existing is not None:
+            await refresh_url_item(existing['id'])
+            return existing['id']
+    
+    # Extract/validate content based on type
+    resolved = await resolve_content(content, source_type)
+    
+    # Chunk the content, dropping or marking near-duplicates of stored chunks
+    chunks = list(chunk_text(resolved.text))
+    stored, fingerprints = await dedupe_chunks(chunks)
+    chunks = [chunks[i] for i in stored]
+    logger.info(f"Split text into {len(chunks)} chunks")
+    
+    # Embed all original chunks in batched requests before touching the database
+    embeddings = await embed_originals(chunks, fingerprints, on_progress)
+    
+    # Insert the item, its chunks and their embeddings in one transaction
+    item_id, chunk_ids, created_at = await db.run_in_thread(
+        db.insert_item_with_chunks,
+        content=resolved.text,
+        source_type=source_type,
+        url=resolved.url,
+        chunks=chunks,
+        embeddings=embeddings,
+        embedding_model=config.AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+        etag=resolved.etag,
+        last_modified=resolved.last_modified,
+        fingerprints=fingerprint_rows(fingerprints)
+    )
+    
+    # Add to vector store
+    chunk_metadatas = build_chunk_metadatas(item_id, chunk_ids, source_type, resolved.url, created_at)
+    await index_chunks(chunks, chunk_metadatas, embeddings)
     
     logger.info(f"Processed {len(chunks)} chunks for item {item_id}")
     return item_id
+
+async def process_contents(entries: List[Tuple[str, str]]) -> List[Tuple[Optional[int], Optional[str]]]:
+    """
+    Ingest many notes and URLs together.
+    
+    URLs are fetched concurrently (within the URL fetcher's limits),
+    the chunks of every item are embedded in shared batched requests, and all
+    rows are written in a single transaction. An item that fails to fetch or
+    validate doesn't affect the others. URLs that are already in the
+    knowledge base are refreshed in place instead. A URL listed more than
+    once is ingested or refreshed once and reported for every listing.
+    
+    Args:
+        entries: List of (content, source_type) pairs
+    
+    Returns:
+        (item_id, None) or (None, error) for each entry, in input order
+    """
+    from database import db
+    
+    distinct: List[Tuple[str, str]] = []
+    url_positions: Dict[str, int] = {}
+    listings = []
+    for content, source_type in entries:
+        if source_type == "url" and content in url_positions:
+            listings.append(url_positions[content])
+            continue
+        if source_type == "url":
+            url_positions[content] = len(distinct)
+        listings.append(len(distinct))
+        distinct.append((content, source_type))
+    if len(distinct) < len(entries):
+        outcomes = await process_contents(distinct)
+        return [outcomes[index] for index in listings]
+    
+    urls = [content for content, source_type in entries if source_type == "url"]
+    existing = await asyncio.gather(*(db.run_in_thread(db.get_item_by_url, url) for url in urls))
+    existing_ids = {url: item['id'] for url, item in zip(urls, existing) if item is not None}
+    
+    async def ingest_or_refresh(content: str, source_type: str):
+        if source_type == "url" and content in existing_ids:
+            await refresh_url_item(existing_ids[content])
+            return existing_ids[content]
+        return await resolve_content(content, source_type)
+    
+    resolved = await asyncio.gather(
+        *(ingest_or_refresh(content, source_type) for content, source_type in entries),
+        return_exceptions=True
+    )
+    
+    results: List[Tuple[Optional[int], Optional[str]]] = [(None, None)] * len(entries)
+    ready = []
+    for position, ((_, source_type), outcome) in enumerate(zip(entries, resolved)):
+        if isinstance(outcome, BaseException):
+            results[position] = (None, str(outcome))
+            continue
+        if isinstance(outcome, int):
+            results[position] = (outcome, None)
+            continue
+        ready.append((position, outcome, source_type, list(chunk_text(outcome.text))))
+    
+    if not ready:
+        return results
+    
+    all_chunks = [chunk for *_, chunks in ready for chunk in chunks]
+    
+    try:
+        # Near-duplicates are found across the whole group, not just against stored chunks
+        stored, fingerprints = await dedupe_chunks(all_chunks)
+        if len(stored) < len(all_chunks):
+            stored_positions = set(stored)
+            offset = 0
+            for entry_index, (position, resolved_content, source_type, chunks) in enumerate(ready):
+                kept = [chunk for i, chunk in enumerate(chunks, offset) if i in stored_positions]
+                ready[entry_index] = (position, resolved_content, source_type, kept)
+                offset += len(chunks)
+            all_chunks = [all_chunks[i] for i in stored]
+        
+        # One embedding pass over every original chunk in the group
+        embeddings = await embed_originals(all_chunks, fingerprints)
+        
+        rows = []
+        offset = 0
+        for _, resolved_content, source_type, chunks in ready:
+            rows.append((
+                resolved_content.text, source_type, resolved_content.url, chunks,
+                embeddings[offset:offset + len(chunks)], resolved_content.etag, resolved_content.last_modified
+            ))
+            offset += len(chunks)
+        
+        inserted = await db.run_in_thread(
+            db.insert_items_with_chunks,
+            rows,
+            config.AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+            fingerprint_rows(fingerprints)
+        )
+    except Exception as e:
+        logger.error(f"Error ingesting {len(ready)} items: {e}")
+        for position, *_ in ready:
+            results[position] = (None, str(e))
+        return results
+    
+    chunk_metadatas = []
+    for (position, resolved_content, source_type, _), (item_id, chunk_ids, created_at) in zip(ready, inserted):
+        chunk_metadatas.extend(
+            build_chunk_metadatas(item_id, chunk_ids, source_type, resolved_content.url, created_at)
+        )
+        results[position] = (item_id, None)
+    
+    await index_chunks(all_chunks, chunk_metadatas, embeddings)
+    
+    logger.info(f"Processed {len(all_chunks)} chunks for {len(ready)} items")
+    return results
@@ -0,0 +1,115 @@
+import asyncio
+from typing import Optional, List, Dict, Any
+from config import config
+from logger import logger
+from database import db
+from ingestion import process_content, refresh_url_item
+
+class IngestionQueue:
+    """
+    Background ingestion backed by the jobs table.
+    
+    Submitting only records a job; a pool of worker tasks claims queued jobs,
+    runs them through process_content (or refresh_url_item for refresh
+    jobs) and records progress, retries with exponential backoff, and the
+    final outcome. Jobs interrupted by a restart
+    are queued again on start.
+    """
+    
+    def __init__(self, worker_count: int = None):
+        self.worker_count = worker_count or config.INGEST_WORKERS
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+    
+    async def start(self):
+        """Requeue interrupted jobs and start the worker tasks."""
+        requeued = await db.run_in_thread(db.requeue_interrupted_jobs)
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted ingestion jobs")
+        
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._run_worker(worker_id))
+            for worker_id in range(self.worker_count)
+        ]
+        logger.info(f"Started {self.worker_count} ingestion workers")
+    
+    async def stop(self):
+        """Cancel the workers; jobs they were running are requeued on next start."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+    
+    async def submit(self, content: str, source_type: str, priority: int = 0) -> int:
+        """Queue content for ingestion and return the job id; higher priority runs first."""
+        job_id = await db.run_in_thread(db.create_job, content, source_type, config.JOB_MAX_ATTEMPTS, priority)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        logger.info(f"Queued ingestion job {job_id} for {source_type}")
+        return job_id
+    
+    async def submit_refresh(self, item_id: int, url: str, priority: int = 0) -> int:
+        """Queue a re-fetch of a URL item by id and return the job id."""
+        job_id = await db.run_in_thread(
+            db.create_job, url, 'url', config.JOB_MAX_ATTEMPTS, priority, item_id
+        )
+        if self._wakeup is not None:
+            self._wakeup.set()
+        logger.info(f"Queued refresh job {job_id} for item {item_id}")
+        return job_id
+    
+    async def _run_worker(self, worker_id: int):
+        """Claim and run jobs until cancelled, idling while the queue is empty."""
+        while True:
+            # Clear before claiming so a submit during the claim still wakes us
+            self._wakeup.clear()
+            try:
+                job = await db.run_in_thread(db.claim_next_job)
+            except Exception as e:
+                logger.error(f"Ingestion worker {worker_id} failed to claim a job: {e}")
+                job = None
+            
+            if job is None:
+                # Also poll, so jobs waiting out a retry delay get picked up
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=config.JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            await self._run_job(job)
+    
+    async def _run_job(self, job: Dict[str, Any]):
+        """Run one claimed job and record its outcome."""
+        job_id = job['id']
+        
+        async def on_progress(embedded: int, total: int):
+            await db.run_in_thread(db.update_job_progress, job_id, embedded, total)
+        
+        try:
+            if job['refresh_item_id'] is not None:
+                item_id = job['refresh_item_id']
+                await refresh_url_item(item_id)
+            else:
+                item_id = await process_content(job['content'], job['source_type'], on_progress)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # A deleted item won't come back; don't retry its refresh
+            if job['attempts'] < job['max_attempts'] and not isinstance(e, LookupError):
+                delay = config.JOB_RETRY_BACKOFF_SECONDS * 2 ** (job['attempts'] - 1)
+                logger.warning(
+                    f"Ingestion job {job_id} attempt {job['attempts']} failed, retrying in {delay:g}s: {e}"
+                )
+                await db.run_in_thread(db.fail_job, job_id, str(e), delay)
+            else:
+                logger.error(f"Ingestion job {job_id} failed after {job['attempts']} attempts: {e}")
+                await db.run_in_thread(db.fail_job, job_id, str(e))
+            return
+        
+        await db.run_in_thread(db.complete_job, job_id, item_id)
+        logger.info(f"Ingestion job {job_id} created item {item_id}")
+
+# Global ingestion queue instance
+ingestion_queue = IngestionQueue()
@@ -29,15 +29,30 @@ async def startup_event():
     try:
         from database import db
         from vector_store import vector_store
-        vector_store.reload_from_database(db)
+        await vector_store.reload_from_database(db)
     except Exception as e:
         logger.error(f"Failed to reload vector store: {e}")
         # Don't fail startup, just log the error
+    
+    # Start processing queued ingestion jobs
+    from jobs import ingestion_queue
+    from refresh_scheduler import refresh_scheduler
+    await ingestion_queue.start()
+    await refresh_scheduler.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down AI Knowledge Inbox API")
+    
+    from database import db
+    from jobs import ingestion_queue
+    from refresh_scheduler import refresh_scheduler
+    from http_client import url_fetcher
+    await refresh_scheduler.stop()
+    await ingestion_queue.stop()
+    await url_fetcher.aclose()
+    db.close()
 
 @app.get("/")
 async def root():
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional, Literal
+from typing import Optional, Literal, List
 from datetime import datetime
 
 class IngestRequest(BaseModel):
@@ -23,6 +23,15 @@ class QueryRequest(BaseModel):
     """Request model for querying the knowledge base."""
     question: str = Field(..., min_length=1, description="Question to ask")
     max_results: Optional[int] = Field(5, ge=1, le=10, description="Maximum number of results")
+    source_type: Optional[Literal["note", "url"]] = Field(None, description="Only search this type of content")
+    item_ids: Optional[List[int]] = Field(None, max_length=500, description="Only search these items")
+    created_after: Optional[datetime] = Field(None, description="Only search items saved at or after this time (UTC if no zone)")
+    created_before: Optional[datetime] = Field(None, description="Only search items saved before this time (UTC if no zone)")
+    mmr_lambda: Optional[float] = Field(None, alias="lambda", ge=0, le=1, description="Relevance vs. diversity trade-off (1 = relevance only)")
+    max_chunks_per_item: Optional[int] = Field(None, ge=0, le=10, description="Most context chunks taken from one item (0 = no cap)")
+    
+    class Config:
+        populate_by_name = True
     
     @validator('question')
     def validate_question(cls, v):
@@ -38,11 +47,20 @@ class SourceSnippet(BaseModel):
     url: Optional[str] = None
     relevance_score: float
 
+class QueryUsage(BaseModel):
+    """Tokens spent on a query."""
+    context_tokens: int  # estimated, retrieved context in the prompt
+    context_chunks: int
+    prompt_tokens: Optional[int] = None  # as reported by the API; not available when streaming
+    completion_tokens: Optional[int] = None
+    cached: bool = False  # answered from the answer cache, no tokens spent
+
 class QueryResponse(BaseModel):
     """Response model for queries."""
     answer: str
     sources: list[SourceSnippet]
     question: str
+    usage: Optional[QueryUsage] = None
 
 class Item(BaseModel):
     """Model for saved items."""
@@ -50,16 +68,60 @@ class Item(BaseModel):
     content: str
     source_type: str
     url: Optional[str] = None
+    fetched_at: Optional[str] = None
+    refresh_interval_seconds: Optional[int] = None
+    citation_count: int = 0
     created_at: str
     
     class Config:
         from_attributes = True
 
+class ItemUpdate(BaseModel):
+    """Request model for changing an item's settings."""
+    refresh_interval_seconds: Optional[int] = Field(None, ge=0)  # None: default interval, 0: never
+
 class IngestResponse(BaseModel):
     """Response model for ingestion."""
     success: bool
     message: str
     item_id: Optional[int] = None
+    job_id: Optional[int] = None
+
+class BulkIngestResult(BaseModel):
+    """Outcome for one entry of a bulk ingestion request."""
+    index: int
+    success: bool
+    item_id: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkIngestResponse(BaseModel):
+    """Response model for bulk ingestion."""
+    total: int
+    succeeded: int
+    failed: int
+    results: List[BulkIngestResult]
+
+class RefreshResponse(BaseModel):
+    """Response model for re-fetching a URL item."""
+    item_id: int
+    status: Literal["not_modified", "unchanged", "updated"]
+    chunks_added: int
+    chunks_removed: int
+    chunks_unchanged: int
+
+class JobStatus(BaseModel):
+    """Model for background ingestion job status."""
+    id: int
+    source_type: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    attempts: int
+    max_attempts: int
+    chunks_total: Optional[int] = None
+    chunks_embedded: int
+    item_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
 
 class ErrorResponse(BaseModel):
     """Standard error response."""
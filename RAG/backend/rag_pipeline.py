@@ -1,16 +1,27 @@
-from openai import AzureOpenAI
-from typing import List, Dict, Any, Tuple
+import asyncio
+import json
+import time
+import numpy as np
+from collections import Counter
+from openai import AsyncAzureOpenAI
+from typing import List, Dict, Any, Tuple, AsyncIterator, Optional
 from config import config
 from logger import logger
 from database import db
 from vector_store import vector_store
+from answer_cache import answer_cache
+from context_packer import context_packer, PackedContext
+from filters import SearchFilter
+from chunking import chunk_text
+
+NO_RESULTS_ANSWER = "I don't have any relevant information to answer this question."
 
 class RAGPipeline:
     """RAG pipeline for chunking, embedding, and question answering."""
     
     def __init__(self):
         if config.AZURE_OPENAI_API_KEY and config.AZURE_OPENAI_ENDPOINT:
-            self.client = AzureOpenAI(
+            self.client = AsyncAzureOpenAI(
                 api_key=config.AZURE_OPENAI_API_KEY,
                 api_version=config.AZURE_OPENAI_API_VERSION,
                 azure_endpoint=config.AZURE_OPENAI_ENDPOINT
@@ -19,60 +30,50 @@ class RAGPipeline:
         else:
             self.client = None
             logger.warning("Azure OpenAI credentials not set")
-    
-    def chunk_text(self, text: str) -> List[str]:
-        """
-        Split text into chunks with overlap.
-        
-        Uses a simple token-based approach with fixed size and overlap.
-        """
-        # Simple word-based chunking (approximates tokens)
-        words = text.split()
-        chunks = []
-        
-        chunk_size = config.CHUNK_SIZE
-        overlap = config.CHUNK_OVERLAP
         
-        if len(words) <= chunk_size:
-            return [text]
-        
-        start = 0
-        while start < len(words):
-            end = start + chunk_size
-            chunk_words = words[start:end]
-            chunk = ' '.join(chunk_words)
-            chunks.append(chunk)
-            
-            # Move start position with overlap
-            start = end - overlap
-            
-            # Prevent infinite loop
-            if start >= len(words):
-                break
+        # Keep cached answers consistent with the vector store
+        vector_store.listeners.append(answer_cache)
         
-        logger.info(f"Split text into {len(chunks)} chunks")
-        return chunks
+        # Skip query embedding until this monotonic time after the endpoint fails
+        self._embedding_retry_at = 0.0
     
-    def process_and_store_content(self, item_id: int, content: str) -> bool:
+    async def process_and_store_content(self, item_id: int, content: str) -> bool:
         """
         Process content: chunk it, generate embeddings, and store in vector store.
         """
         try:
+            item = await db.run_in_thread(db.get_item_by_id, item_id)
+            if not item:
+                raise ValueError(f"Item {item_id} not found")
+            
             # Chunk the content
-            chunks = self.chunk_text(content)
-            
-            # Store each chunk
-            for idx, chunk_text in enumerate(chunks):
-                # Save chunk to database
-                chunk_id = db.insert_chunk(item_id, chunk_text, idx)
-                
-                # Add to vector store with metadata
-                chunk_metadata = {
+            chunks = list(chunk_text(content))
+            
+            # Embed all chunks in batched requests
+            embeddings = await vector_store.generate_embeddings(chunks)
+            
+            # Save chunks and their embeddings to database in one transaction
+            chunk_ids = await db.run_in_thread(
+                db.insert_chunks,
+                item_id,
+                chunks,
+                embeddings,
+                config.AZURE_OPENAI_EMBEDDING_DEPLOYMENT
+            )
+            
+            # Add to vector store with metadata
+            chunk_metadatas = [
+                {
                     'chunk_id': chunk_id,
                     'item_id': item_id,
-                    'chunk_index': idx
+                    'chunk_index': idx,
+                    'source_type': item['source_type'],
+                    'url': item['url'],
+                    'created_at': item['created_at']
                 }
-                vector_store.add_chunk(chunk_text, chunk_metadata)
+                for idx, chunk_id in enumerate(chunk_ids)
+            ]
+            await vector_store.add_chunks(chunks, chunk_metadatas, embeddings)
             
             logger.info(f"Processed {len(chunks)} chunks for item {item_id}")
             return True
@@ -81,41 +82,40 @@ class RAGPipeline:
             logger.error(f"Error processing content for item {item_id}: {e}")
             return False
     
-    def generate_answer(self, question: str, context_chunks: List[Tuple[Dict[str, Any], float]]) -> str:
+    def build_messages(self, question: str, context: PackedContext) -> List[Dict[str, str]]:
+        """Build the chat messages for a question and its packed context."""
+        # Create messages for chat completion
+        return [
+            {
+                "role": "system",
+                "content": "You are a helpful assistant answering questions based on the user's saved knowledge base. Answer questions based ONLY on the provided context. If the context doesn't contain enough information, say so. Be concise and accurate."
+            },
+            {
+                "role": "user",
+                "content": f"""Context from knowledge base:
+{context.text}
+
+Question: {question}
+
+Please answer the question based on the context above. Cite which parts of the context you used."""
+            }
+        ]
+    
+    async def generate_answer(self, question: str, context: PackedContext) -> Tuple[str, Any]:
         """
         Generate an answer using Azure OpenAI with retrieved context.
+        
+        Returns:
+            Tuple of (answer, token usage reported by the API, or None)
         """
         try:
             if not self.client:
                 raise ValueError("Azure OpenAI client not configured")
             
-            # Build context from chunks
-            context_parts = []
-            for chunk_data, score in context_chunks:
-                chunk_text = chunk_data['text']
-                context_parts.append(f"[Relevance: {score:.2f}] {chunk_text}")
-            
-            context = "\n\n".join(context_parts)
-            
-            # Create messages for chat completion
-            messages = [
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant answering questions based on the user's saved knowledge base. Answer questions based ONLY on the provided context. If the context doesn't contain enough information, say so. Be concise and accurate."
-                },
-                {
-                    "role": "user",
-                    "content": f"""Context from knowledge base:
-{context}
-
-Question: {question}
-
-Please answer the question based on the context above. Cite which parts of the context you used."""
-                }
-            ]
+            messages = self.build_messages(question, context)
             
             # Generate response using Azure OpenAI
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=config.AZURE_OPENAI_CHAT_DEPLOYMENT,
                 messages=messages,
                 temperature=config.TEMPERATURE,
@@ -124,57 +124,393 @@ Please answer the question based on the context above. Cite which parts of the c
             
             answer = response.choices[0].message.content
             logger.info(f"Generated answer for question: {question[:50]}...")
-            return answer
+            return answer, response.usage
             
         except Exception as e:
             logger.error(f"Error generating answer: {e}")
             raise
     
-    def query(self, question: str, max_results: int = 5) -> Tuple[str, List[Dict[str, Any]]]:
+    async def stream_answer(self, question: str, context: PackedContext) -> AsyncIterator[str]:
+        """
+        Stream an answer from Azure OpenAI token by token.
+        
+        Yields:
+            Text deltas as the model produces them
+        """
+        try:
+            if not self.client:
+                raise ValueError("Azure OpenAI client not configured")
+            
+            messages = self.build_messages(question, context)
+            
+            stream = await self.client.chat.completions.create(
+                model=config.AZURE_OPENAI_CHAT_DEPLOYMENT,
+                messages=messages,
+                temperature=config.TEMPERATURE,
+                max_tokens=800,
+                stream=True
+            )
+            
+            async for chunk in stream:
+                # Azure sends an initial chunk with no choices (content filter results)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+            
+            logger.info(f"Streamed answer for question: {question[:50]}...")
+        
+        except Exception as e:
+            logger.error(f"Error streaming answer: {e}")
+            raise
+    
+    def build_sources(self, search_results: List[Tuple[Dict[str, Any], float]]) -> List[Dict[str, Any]]:
+        """Turn search results into source snippets, one per item."""
+        sources = []
+        seen_items = set()
+        
+        for chunk_data, score in search_results:
+            item_id = chunk_data['metadata']['item_id']
+            
+            # Avoid duplicate items in sources
+            if item_id in seen_items:
+                continue
+            seen_items.add(item_id)
+            
+            # Item details travel with the chunk metadata; no database lookup needed
+            metadata = chunk_data['metadata']
+            sources.append({
+                'item_id': item_id,
+                'content': chunk_data['text'][:200] + "..." if len(chunk_data['text']) > 200 else chunk_data['text'],
+                'source_type': metadata['source_type'],
+                'url': metadata.get('url'),
+                'relevance_score': float(score)
+            })
+        
+        return sources
+    
+    @staticmethod
+    def build_usage(context: Optional[PackedContext] = None, completion_usage: Any = None,
+                    cached: bool = False) -> Dict[str, Any]:
+        """Token usage of one query: the packed context, plus what the API reported if available."""
+        spent = 0 if cached else None  # cache hits make no API call
+        return {
+            'context_tokens': context.tokens if context else 0,
+            'context_chunks': len(context.chunks) if context else 0,
+            'prompt_tokens': getattr(completion_usage, 'prompt_tokens', spent),
+            'completion_tokens': getattr(completion_usage, 'completion_tokens', spent),
+            'cached': cached
+        }
+    
+    @property
+    def retrieval_mode(self) -> str:
+        """Configured retrieval mode, or vector when SQLite lacks FTS5."""
+        return config.RETRIEVAL_MODE if db.fts_enabled else "vector"
+    
+    async def embed_query(self, question: str) -> Optional[List[float]]:
+        """
+        Embed a question for vector retrieval.
+        
+        Outside pure vector mode a slow or failing embedding endpoint is not
+        fatal: after QUERY_EMBEDDING_TIMEOUT None is returned and retrieval
+        falls back to lexical search, without retrying the endpoint for
+        EMBEDDING_RETRY_SECONDS. Vector mode has no fallback and waits.
+        """
+        mode = self.retrieval_mode
+        if mode == "lexical":
+            return None
+        if mode == "vector":
+            # Nothing to fall back to, so wait for the endpoint however long it takes
+            return await vector_store.generate_query_embedding(question)
+        if time.monotonic() < self._embedding_retry_at:
+            return None
+        
+        try:
+            return await asyncio.wait_for(
+                vector_store.generate_query_embedding(question),
+                timeout=config.QUERY_EMBEDDING_TIMEOUT
+            )
+        except Exception as e:
+            self._embedding_retry_at = time.monotonic() + config.EMBEDDING_RETRY_SECONDS
+            logger.warning(f"Query embedding unavailable, using lexical search only: {e!r}")
+            return None
+    
+    async def lexical_search(self, question: str, top_k: int,
+                             search_filter: Optional[SearchFilter] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """BM25 search over chunk text, in the same shape as vector search results."""
+        rows = await db.run_in_thread(db.search_chunks, question, top_k, search_filter)
+        return [
+            (
+                {
+                    'text': row['chunk_text'],
+                    'metadata': {
+                        'chunk_id': row['id'],
+                        'item_id': row['item_id'],
+                        'chunk_index': row['chunk_index'],
+                        'source_type': row['source_type'],
+                        'url': row['url'],
+                        'created_at': row['created_at'],
+                        'duplicate_of': row['duplicate_of']
+                    }
+                },
+                -row['rank']  # FTS5 bm25() is lower-is-better
+            )
+            for row in rows
+        ]
+    
+    def fuse_rankings(self, rankings: List[List[Tuple[Dict[str, Any], float]]],
+                      top_k: int) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Combine rankings with reciprocal rank fusion.
+        
+        Each chunk scores sum(1 / (RRF_K + rank)) over the rankings it appears
+        in, rescaled so a chunk ranked first everywhere scores 1.0.
+        """
+        k = config.RRF_K
+        fused: Dict[int, List] = {}
+        
+        for ranking in rankings:
+            for rank, (chunk_data, _) in enumerate(ranking, start=1):
+                entry = fused.setdefault(chunk_data['metadata']['chunk_id'], [chunk_data, 0.0])
+                entry[1] += 1.0 / (k + rank)
+        
+        best = len(rankings) / (k + 1)
+        results = sorted(fused.values(), key=lambda entry: entry[1], reverse=True)[:top_k]
+        return [(chunk_data, score / best) for chunk_data, score in results]
+    
+    def diversify(self, results: List[Tuple[Dict[str, Any], float]], max_results: int, mmr_lambda: float,
+                  max_chunks_per_item: Optional[int]) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Re-rank results with maximal marginal relevance and a per-item cap.
+        
+        Results are picked one at a time by
+        mmr_lambda * relevance - (1 - mmr_lambda) * max similarity to those
+        already picked, with relevance the retrieval score relative to the
+        best one and similarity the cosine of the chunks' stored embeddings
+        (a linked near-duplicate uses its original's). Items already holding max_chunks_per_item picks are passed over.
+        Picks keep their original scores.
+        """
+        if not results:
+            return results
+        
+        vectors = vector_store.get_embeddings([
+            chunk_data['metadata'].get('duplicate_of') or chunk_data['metadata']['chunk_id']
+            for chunk_data, _ in results
+        ])
+        similarity = vectors @ vectors.T
+        scores = np.array([score for _, score in results], dtype=np.float32)
+        relevance = scores / scores.max() if scores.max() > 0 else np.ones_like(scores)
+        item_ids = np.array([chunk_data['metadata']['item_id'] for chunk_data, _ in results])
+        
+        available = np.ones(len(results), dtype=bool)
+        redundancy = np.zeros(len(results), dtype=np.float32)
+        picks_per_item: Counter = Counter()
+        selected = []
+        while len(selected) < max_results and available.any():
+            marginal = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+            pick = int(np.argmax(np.where(available, marginal, -np.inf)))
+            selected.append(pick)
+            available[pick] = False
+            redundancy = np.maximum(redundancy, similarity[pick])
+            
+            item_id = item_ids[pick]
+            picks_per_item[item_id] += 1
+            if max_chunks_per_item and picks_per_item[item_id] >= max_chunks_per_item:
+                available[item_ids == item_id] = False
+        
+        return [results[position] for position in selected]
+    
+    def _diversity_options(self, mmr_lambda: Optional[float],
+                           max_chunks_per_item: Optional[int]) -> Tuple[float, Optional[int]]:
+        """Fill unset diversity options from the config; a cap of 0 means none."""
+        if mmr_lambda is None:
+            mmr_lambda = config.MMR_LAMBDA
+        if max_chunks_per_item is None:
+            max_chunks_per_item = config.MAX_CHUNKS_PER_ITEM
+        return mmr_lambda, max_chunks_per_item or None
+    
+    def _pool_size(self, max_results: int, mmr_lambda: float, max_chunks_per_item: Optional[int]) -> int:
+        """How many fused results to retrieve; a deeper pool when re-ranking for diversity."""
+        if mmr_lambda >= 1 and (max_chunks_per_item is None or max_chunks_per_item >= max_results):
+            return max_results
+        return max(config.MMR_CANDIDATES, max_results)
+    
+    def _candidate_depth(self, max_results: int) -> int:
+        """How many results each ranking contributes before fusion."""
+        if self.retrieval_mode == "vector":
+            return max_results
+        return max(config.HYBRID_CANDIDATES, max_results)
+    
+    async def retrieve(self, question: str, query_embedding: Optional[List[float]], max_results: int,
+                       search_filter: Optional[SearchFilter] = None, mmr_lambda: float = 1.0,
+                       max_chunks_per_item: Optional[int] = None) -> Tuple[List[Tuple[Dict[str, Any], float]], List[Tuple[Dict[str, Any], float]]]:
+        """
+        Retrieve context chunks according to RETRIEVAL_MODE.
+        
+        Unless mmr_lambda is 1 and no per-item cap applies, a pool of
+        MMR_CANDIDATES results is retrieved and diversified down to max_results.
+        
+        Returns:
+            Tuple of (results, vector_results) where vector_results is the
+            cosine ranking the results were drawn from, empty without an embedding
+        """
+        pool = self._pool_size(max_results, mmr_lambda, max_chunks_per_item)
+        depth = self._candidate_depth(pool)
+        if self.retrieval_mode == "vector":
+            vector_results = await vector_store.search_by_embedding(query_embedding, depth, search_filter)
+            results = vector_results
+        else:
+            lexical = self.lexical_search(question, depth, search_filter)
+            
+            if query_embedding is None:
+                results, vector_results = self.fuse_rankings([await lexical], pool), []
+            else:
+                vector_results, lexical_results = await asyncio.gather(
+                    vector_store.search_by_embedding(query_embedding, depth, search_filter),
+                    lexical
+                )
+                results = self.fuse_rankings([vector_results, lexical_results], pool)
+        
+        if pool > max_results:
+            results = self.diversify(results, max_results, mmr_lambda, max_chunks_per_item)
+        return results, vector_results
+    
+    def _cache_scope(self, max_results: int, search_filter: Optional[SearchFilter],
+                     mmr_lambda: float, max_chunks_per_item: Optional[int]) -> str:
+        """Key the answer cache on every option that changes the answer."""
+        return json.dumps({
+            'max_results': max_results,
+            'filter': search_filter.cache_key() if search_filter else None,
+            'mmr_lambda': mmr_lambda,
+            'max_chunks_per_item': max_chunks_per_item
+        }, sort_keys=True)
+    
+    def _cache_answer(self, question: str, scope: str, query_embedding, answer: str,
+                      sources: List[Dict[str, Any]], search_results: List[Tuple[Dict[str, Any], float]],
+                      vector_results: List[Tuple[Dict[str, Any], float]], pool: int):
+        """Store a generated answer with what it needs for invalidation."""
+        # Answers from the lexical fallback are retried once embeddings recover
+        if query_embedding is None:
+            return
+        
+        item_ids = {chunk_data['metadata']['item_id'] for chunk_data, _ in search_results}
+        
+        # A new chunk can only change the answer by entering the vector ranking: above
+        # its weakest hit when the ranking is full, anywhere when it is not. New
+        # lexical-only matches are picked up when the entry expires.
+        if vector_results and len(vector_results) >= self._candidate_depth(pool):
+            min_score = min(score for _, score in vector_results)
+        else:
+            min_score = float('-inf')
+        
+        answer_cache.put(question, scope, answer, sources, query_embedding, item_ids, min_score)
+    
+    async def query(self, question: str, max_results: int = 5,
+                    search_filter: Optional[SearchFilter] = None, mmr_lambda: Optional[float] = None,
+                    max_chunks_per_item: Optional[int] = None) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
         """
         Query the knowledge base and generate an answer.
         
+        An optional filter limits retrieval to matching chunks. mmr_lambda
+        and max_chunks_per_item tune diversity re-ranking and default to
+        MMR_LAMBDA and MAX_CHUNKS_PER_ITEM.
+        
         Returns:
-            Tuple of (answer, source_snippets)
+            Tuple of (answer, source_snippets, usage)
         """
         try:
-            # Search vector store
-            search_results = vector_store.search(question, top_k=max_results)
+            mmr_lambda, max_chunks_per_item = self._diversity_options(mmr_lambda, max_chunks_per_item)
+            
+            # Exact repeat of a recent question
+            scope = self._cache_scope(max_results, search_filter, mmr_lambda, max_chunks_per_item)
+            cached = answer_cache.get(question, scope)
+            if cached:
+                return cached.answer, cached.sources, self.build_usage(cached=True)
+            
+            # Near-duplicate of a recent question
+            query_embedding = await self.embed_query(question)
+            if query_embedding is not None:
+                cached = answer_cache.get_similar(query_embedding, scope)
+                if cached:
+                    return cached.answer, cached.sources, self.build_usage(cached=True)
+            
+            search_results, vector_results = await self.retrieve(
+                question, query_embedding, max_results, search_filter, mmr_lambda, max_chunks_per_item
+            )
             
             if not search_results:
-                return "I don't have any relevant information to answer this question.", []
+                return NO_RESULTS_ANSWER, [], self.build_usage()
+            
+            # Fit the results into the prompt budget; a budget too small for any sentence leaves nothing
+            context = context_packer.pack(question, search_results)
+            if not context.chunks:
+                return NO_RESULTS_ANSWER, [], self.build_usage(context)
             
             # Generate answer
-            answer = self.generate_answer(question, search_results)
+            answer, completion_usage = await self.generate_answer(question, context)
             
-            # Prepare source snippets
-            sources = []
-            seen_items = set()
+            # Prepare source snippets from the chunks the answer was given
+            sources = self.build_sources(context.chunks)
             
-            for chunk_data, score in search_results:
-                item_id = chunk_data['metadata']['item_id']
-                
-                # Avoid duplicate items in sources
-                if item_id in seen_items:
-                    continue
-                seen_items.add(item_id)
-                
-                # Get item details from database
-                item = db.get_item_by_id(item_id)
-                if item:
-                    sources.append({
-                        'item_id': item_id,
-                        'content': chunk_data['text'][:200] + "..." if len(chunk_data['text']) > 200 else chunk_data['text'],
-                        'source_type': item['source_type'],
-                        'url': item.get('url'),
-                        'relevance_score': float(score)
-                    })
-            
-            return answer, sources
+            pool = self._pool_size(max_results, mmr_lambda, max_chunks_per_item)
+            self._cache_answer(question, scope, query_embedding, answer, sources, search_results, vector_results,
+                               pool)
+            return answer, sources, self.build_usage(context, completion_usage)
             
         except Exception as e:
             logger.error(f"Error during query: {e}")
             raise
+    
+    async def query_stream(self, question: str, max_results: int = 5,
+                           search_filter: Optional[SearchFilter] = None, mmr_lambda: Optional[float] = None,
+                           max_chunks_per_item: Optional[int] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Query the knowledge base, streaming the answer as it is generated.
+        
+        Yields:
+            ("sources", source_snippets) right after retrieval,
+            ("token", text) for each answer delta, then ("usage", usage)
+        """
+        mmr_lambda, max_chunks_per_item = self._diversity_options(mmr_lambda, max_chunks_per_item)
+        scope = self._cache_scope(max_results, search_filter, mmr_lambda, max_chunks_per_item)
+        query_embedding = None
+        cached = answer_cache.get(question, scope)
+        if not cached:
+            query_embedding = await self.embed_query(question)
+            if query_embedding is not None:
+                cached = answer_cache.get_similar(query_embedding, scope)
+        
+        if cached:
+            yield "sources", cached.sources
+            yield "token", cached.answer
+            yield "usage", self.build_usage(cached=True)
+            return
+        
+        search_results, vector_results = await self.retrieve(
+            question, query_embedding, max_results, search_filter, mmr_lambda, max_chunks_per_item
+        )
+        
+        context = context_packer.pack(question, search_results) if search_results else None
+        if context is None or not context.chunks:
+            yield "sources", []
+            yield "token", NO_RESULTS_ANSWER
+            yield "usage", self.build_usage(context)
+            return
+        
+        sources = self.build_sources(context.chunks)
+        yield "sources", sources
+        
+        answer_parts = []
+        async for delta in self.stream_answer(question, context):
+            answer_parts.append(delta)
+            yield "token", delta
+        
+        # Only a fully streamed answer is worth caching
+        pool = self._pool_size(max_results, mmr_lambda, max_chunks_per_item)
+        self._cache_answer(question, scope, query_embedding, "".join(answer_parts), sources,
+                           search_results, vector_results, pool)
+        yield "usage", self.build_usage(context)
 
 # Global RAG pipeline instance
 rag_pipeline = RAGPipeline()
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Optional, Iterable, Dict, Any
+from config import config
+from logger import logger
+from database import db
+from jobs import ingestion_queue
+
+# Refreshes queue behind everything submitted through the API
+REFRESH_JOB_PRIORITY = -1
+
+class RefreshScheduler:
+    """
+    Periodically re-fetches URL items through the ingestion queue.
+    
+    Every URL item gets a next refresh time one interval (its own, or
+    REFRESH_INTERVAL_SECONDS) after its last fetch, jittered so items
+    ingested together spread out. Due items are queued as low-priority
+    ingestion jobs, most-cited first, at no more than
+    REFRESH_FETCHES_PER_MINUTE; the job workers then refresh them
+    conditionally and embed only changed chunks, so refreshes share the
+    workers' embedding throughput instead of competing with it.
+    """
+    
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        
+        # Citations counted on the query path, written to the database each tick
+        self._citations: Counter = Counter()
+        
+        # Token bucket holding up to a minute's worth of fetches
+        self._budget = 0.0
+        self._last_tick: Optional[float] = None
+        self.queued = 0
+    
+    @property
+    def fetches_per_minute(self) -> int:
+        return config.REFRESH_FETCHES_PER_MINUTE
+    
+    def record_citations(self, item_ids: Iterable[int]):
+        """Count items cited in an answer, to prioritize their refreshes."""
+        self._citations.update(item_ids)
+    
+    async def start(self):
+        """Start the scheduling loop, unless refreshes are disabled."""
+        if self.fetches_per_minute <= 0:
+            logger.info("URL refresh scheduler disabled")
+            return
+        self._last_tick = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Started URL refresh scheduler ({self.fetches_per_minute} fetches/minute)")
+    
+    async def stop(self):
+        """Stop the loop; refreshes already queued stay in the jobs table."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        
+        # Don't lose citations counted since the last tick
+        if self._citations:
+            await self._flush_citations()
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"URL refresh scheduling failed: {e}")
+            await asyncio.sleep(config.REFRESH_CHECK_SECONDS)
+    
+    async def _flush_citations(self):
+        citations, self._citations = self._citations, Counter()
+        await db.run_in_thread(db.add_citations, dict(citations))
+    
+    async def tick(self) -> int:
+        """
+        Queue refreshes for due items within the fetch budget.
+        
+        Returns:
+            Number of refreshes queued
+        """
+        if self._citations:
+            await self._flush_citations()
+        
+        default_interval = config.REFRESH_INTERVAL_SECONDS
+        await db.run_in_thread(db.schedule_url_refreshes, default_interval, config.REFRESH_JITTER)
+        
+        now = time.monotonic()
+        self._budget = min(
+            self.fetches_per_minute,
+            self._budget + (now - self._last_tick) * self.fetches_per_minute / 60
+        )
+        self._last_tick = now
+        
+        # Refreshes still waiting for a worker count against the budget too
+        pending = await db.run_in_thread(db.count_queued_jobs, REFRESH_JOB_PRIORITY)
+        limit = int(min(self._budget, self.fetches_per_minute - pending))
+        if limit <= 0:
+            return 0
+        
+        due = await db.run_in_thread(db.claim_due_refreshes, time.time(), limit, default_interval)
+        for item in due:
+            await ingestion_queue.submit_refresh(item['id'], item['url'], REFRESH_JOB_PRIORITY)
+        
+        self._budget -= len(due)
+        self.queued += len(due)
+        if due:
+            logger.info(f"Queued {len(due)} URL refreshes")
+        return len(due)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self._task is not None,
+            'fetches_per_minute': self.fetches_per_minute,
+            'queued': self.queued
+        }
+
+# Global refresh scheduler instance
+refresh_scheduler = RefreshScheduler()
@@ -1,17 +1,30 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import Optional, List
-from models import IngestRequest, IngestResponse, Item, QueryRequest, QueryResponse, SourceSnippet
+import json
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import Optional, List, Any, AsyncIterator, Tuple
+from models import (
+    IngestRequest, IngestResponse, BulkIngestResult, BulkIngestResponse, Item, JobStatus,
+    ItemUpdate, RefreshResponse, QueryRequest, QueryResponse, QueryUsage, SourceSnippet
+)
+from config import config
 from database import db
-from ingestion import process_content
+from ingestion import content_ingestion, process_contents, refresh_url_item, promote_duplicates
+from jobs import ingestion_queue
+from refresh_scheduler import refresh_scheduler
 from rag_pipeline import rag_pipeline
+from vector_store import vector_store
+from filters import SearchFilter
 from logger import logger
 
 router = APIRouter(prefix="/api", tags=["api"])
 
-@router.post("/ingest", response_model=IngestResponse)
+@router.post("/ingest", response_model=IngestResponse, status_code=202)
 async def ingest_content(request: IngestRequest):
     """
-    Ingest content (note or URL) into the knowledge base.
+    Queue content (note or URL) for ingestion into the knowledge base.
+    
+    Returns immediately with a job id; poll GET /api/jobs/{job_id} for progress.
     """
     try:
         content = request.content
@@ -21,28 +34,144 @@ async def ingest_content(request: IngestRequest):
         if source_type not in ["note", "url"]:
             raise HTTPException(status_code=400, detail="source_type must be 'note' or 'url'")
         
-        # Process the content
-        item_id = await process_content(content, source_type)
+        # Reject invalid notes now rather than in a job that can never succeed
+        if source_type == "note":
+            is_valid, error = content_ingestion.validate_note(content)
+            if not is_valid:
+                raise HTTPException(status_code=400, detail=f"Invalid note content: {error}")
         
-        logger.info(f"Successfully ingested {source_type} with ID {item_id}")
+        job_id = await ingestion_queue.submit(content, source_type)
         
         return IngestResponse(
             success=True,
-            message=f"Successfully ingested {source_type}",
-            item_id=item_id
+            message=f"Queued {source_type} for ingestion",
+            job_id=job_id
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error during ingestion: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def read_bulk_entries(request: Request) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yield (index, entry) pairs from a JSON array or an NDJSON body.
+    
+    NDJSON is parsed line by line as it streams in; a line that isn't valid
+    JSON is yielded as its ValueError so it can be reported per entry.
+    """
+    content_type = request.headers.get("content-type", "")
+    
+    if "ndjson" not in content_type and "jsonlines" not in content_type:
+        try:
+            entries = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(entries, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array of ingest requests")
+        for index, entry in enumerate(entries):
+            yield index, entry
+        return
+    
+    index = 0
+    buffer = b""
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                try:
+                    yield index, json.loads(line)
+                except ValueError as e:
+                    yield index, e
+                index += 1
+    if buffer.strip():
+        try:
+            yield index, json.loads(buffer)
+        except ValueError as e:
+            yield index, e
+
+@router.post("/ingest/bulk", response_model=BulkIngestResponse)
+async def ingest_bulk(request: Request):
+    """
+    Ingest many notes and URLs in one call.
+    
+    Accepts a JSON array of ingest requests, or NDJSON (one per line) with
+    Content-Type application/x-ndjson. Entries are processed in groups of
+    BULK_GROUP_SIZE: URLs fetched concurrently, embeddings batched across
+    items, one transaction per group. Returns a result per entry.
+    """
+    try:
+        results: List[BulkIngestResult] = []
+        group: List[Tuple[int, IngestRequest]] = []
+        
+        async def flush():
+            outcomes = await process_contents([(entry.content, entry.source_type) for _, entry in group])
+            for (index, _), (item_id, error) in zip(group, outcomes):
+                results.append(BulkIngestResult(index=index, success=error is None, item_id=item_id, error=error))
+            group.clear()
+        
+        async for index, entry in read_bulk_entries(request):
+            try:
+                if isinstance(entry, Exception):
+                    raise entry
+                if not isinstance(entry, dict):
+                    raise ValueError("Entry must be an object with content and source_type")
+                group.append((index, IngestRequest(**entry)))
+            except ValidationError as e:
+                error = "; ".join(err['msg'] for err in e.errors())
+                results.append(BulkIngestResult(index=index, success=False, error=error))
+            except ValueError as e:
+                results.append(BulkIngestResult(index=index, success=False, error=f"Invalid entry: {e}"))
+            
+            if len(group) >= config.BULK_GROUP_SIZE:
+                await flush()
+        
+        if group:
+            await flush()
+        
+        results.sort(key=lambda result: result.index)
+        succeeded = sum(result.success for result in results)
+        logger.info(f"Bulk ingested {succeeded} of {len(results)} entries")
+        
+        return BulkIngestResponse(
+            total=len(results),
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+            results=results
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error during bulk ingestion: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: int):
+    """
+    Report the status and progress of an ingestion job.
+    """
+    try:
+        job = await db.run_in_thread(db.get_job, job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        return job
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/items", response_model=List[Item])
 async def get_items(source_type: Optional[str] = Query(None, regex="^(note|url)$")):
     """
     Retrieve all saved items, optionally filtered by type.
     """
     try:
-        items = db.get_all_items(source_type)
+        items = await db.run_in_thread(db.get_all_items, source_type)
         logger.info(f"Retrieved {len(items)} items (filter: {source_type})")
         return items
         
@@ -56,7 +185,7 @@ async def get_item(item_id: int):
     Retrieve a specific item by ID.
     """
     try:
-        item = db.get_item_by_id(item_id)
+        item = await db.run_in_thread(db.get_item_by_id, item_id)
         if not item:
             raise HTTPException(status_code=404, detail=f"Item {item_id} not found")
         
@@ -69,21 +198,62 @@ async def get_item(item_id: int):
         logger.error(f"Error retrieving item {item_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.patch("/items/{item_id}", response_model=Item)
+async def update_item(item_id: int, update: ItemUpdate):
+    """
+    Change an item's refresh interval (null for the default, 0 to never refresh).
+    """
+    try:
+        updated = await db.run_in_thread(db.set_refresh_interval, item_id, update.refresh_interval_seconds)
+        if not updated:
+            raise HTTPException(status_code=404, detail=f"Item {item_id} not found")
+        
+        logger.info(f"Set refresh interval of item {item_id} to {update.refresh_interval_seconds}")
+        return await db.run_in_thread(db.get_item_by_id, item_id)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating item {item_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/items/{item_id}/refresh", response_model=RefreshResponse)
+async def refresh_item(item_id: int):
+    """
+    Re-fetch a URL item, re-embedding only the chunks that changed.
+    """
+    try:
+        return await refresh_url_item(item_id)
+    
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error refreshing item {item_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.delete("/items/{item_id}")
 async def delete_item(item_id: int):
     """
-    Delete an item and its associated chunks from the database.
+    Delete an item and its associated chunks from the database and vector store.
     """
     try:
         # Check if item exists
-        item = db.get_item_by_id(item_id)
+        item = await db.run_in_thread(db.get_item_by_id, item_id)
         if not item:
             raise HTTPException(status_code=404, detail=f"Item {item_id} not found")
         
+        # Near-duplicates in other items that link to this item's chunks need a new original
+        chunks = await db.run_in_thread(db.get_chunks_by_item_id, item_id)
+        await promote_duplicates([chunk['id'] for chunk in chunks])
+        
         # Delete the item (cascades to chunks)
-        success = db.delete_item(item_id)
+        success = await db.run_in_thread(db.delete_item, item_id)
         
         if success:
+            # Drop its chunks from search results right away
+            vector_store.remove_item(item_id)
             logger.info(f"Deleted item {item_id}")
             return {
                 "success": True,
@@ -109,32 +279,104 @@ async def query_knowledge_base(request: QueryRequest):
         max_results = request.max_results or 5
         
         # Query the RAG pipeline
-        answer, sources = rag_pipeline.query(question, max_results)
+        answer, sources, usage = await rag_pipeline.query(
+            question, max_results, build_search_filter(request), request.mmr_lambda, request.max_chunks_per_item
+        )
+        refresh_scheduler.record_citations(source['item_id'] for source in sources)
         
         # Convert sources to response model
         source_snippets = [
             SourceSnippet(**source) for source in sources
         ]
         
-        logger.info(f"Answered query with {len(source_snippets)} sources")
+        logger.info(
+            f"Answered query with {len(source_snippets)} sources "
+            f"({usage['context_tokens']} context tokens, {usage['prompt_tokens']} prompt tokens)"
+        )
         
         return QueryResponse(
             answer=answer,
             sources=source_snippets,
-            question=question
+            question=question,
+            usage=QueryUsage(**usage)
         )
         
     except Exception as e:
         logger.error(f"Error during query: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def build_search_filter(request: QueryRequest) -> Optional[SearchFilter]:
+    """Collect the query's filter fields, or None if none are set."""
+    search_filter = SearchFilter(
+        source_type=request.source_type,
+        item_ids=request.item_ids,
+        created_after=request.created_after,
+        created_before=request.created_before
+    )
+    return None if search_filter.is_empty() else search_filter
+
+def format_sse(event: str, data: Any) -> str:
+    """Format a Server-Sent Events frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/query/stream")
+async def query_knowledge_base_stream(request: QueryRequest):
+    """
+    Query the knowledge base, streaming the response as Server-Sent Events.
+    
+    Emits a `sources` event right after retrieval, `token` events as the
+    answer is generated, `usage` with the tokens spent, then `done`
+    (or `error` if anything fails).
+    """
+    question = request.question
+    max_results = request.max_results or 5
+    search_filter = build_search_filter(request)
+    
+    async def event_stream():
+        try:
+            async for event, data in rag_pipeline.query_stream(
+                question, max_results, search_filter, request.mmr_lambda, request.max_chunks_per_item
+            ):
+                if event == "sources":
+                    refresh_scheduler.record_citations(source['item_id'] for source in data)
+                    data = [SourceSnippet(**source).model_dump() for source in data]
+                elif event == "usage":
+                    data = QueryUsage(**data).model_dump()
+                yield format_sse(event, data)
+            
+            logger.info(f"Streamed answer for query: {question[:50]}")
+            yield format_sse("done", {"question": question})
+        
+        except Exception as e:
+            logger.error(f"Error during streaming query: {e}")
+            yield format_sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering so tokens arrive immediately
+        }
+    )
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint."""
-    from vector_store import vector_store
+    from embedding_cache import embedding_cache
+    from answer_cache import answer_cache
+    from dedup import chunk_deduplicator
+    from context_packer import context_packer
     
     return {
         "status": "healthy",
-        "items_count": len(db.get_all_items()),
-        "vector_store_size": vector_store.size()
+        "items_count": len(await db.run_in_thread(db.get_all_items)),
+        "vector_store_size": vector_store.size(),
+        "vector_index": vector_store.index.name,
+        "retrieval_mode": rag_pipeline.retrieval_mode,
+        "embedding_cache": embedding_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "refresh_scheduler": refresh_scheduler.stats(),
+        "dedup": chunk_deduplicator.stats(),
+        "context_packer": context_packer.stats()
     }
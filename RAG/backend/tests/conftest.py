@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Backend modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# The global database is created on import; keep it away from the real one
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="knowledge_inbox_tests_"), "test.db")
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+
+import hashlib
+import numpy as np
+import pytest
+from config import config
+from vector_store import vector_store
+
+def fake_embedding(text: str):
+    seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+    return np.random.default_rng(seed).standard_normal(config.EMBEDDING_DIMENSION).tolist()
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    """Embed texts deterministically instead of calling Azure."""
+    async def generate_embeddings(texts, on_progress=None):
+        return [fake_embedding(text) for text in texts]
+    
+    monkeypatch.setattr(vector_store, "generate_embeddings", generate_embeddings)
+
+@pytest.fixture(params=["flat", "hnsw"])
+def index_type(request, monkeypatch):
+    """Run a test against each exact and graph index backend."""
+    monkeypatch.setattr(config, "VECTOR_STORE_TYPE", request.param)
+    # Search the whole graph at test sizes so results are comparable to a scan
+    monkeypatch.setattr(config, "HNSW_EF_SEARCH", 4096)
+    return request.param
@@ -0,0 +1,24 @@
+import numpy as np
+from answer_cache import AnswerCache
+
+def test_chunks_added_invalidates_entries_a_new_chunk_outranks():
+    rng = np.random.default_rng(0)
+    cache = AnswerCache(max_entries=100, similarity_threshold=0.9)
+    for number in range(50):
+        cache.put(f"question {number}", "scope", "answer", [], rng.standard_normal(16), {1},
+                  min_score=0.3 if number % 2 else 0.9)
+    cache.put("no embedding", "scope", "answer", [], None, {1}, min_score=0.0)
+    
+    vectors = rng.standard_normal((20, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = {
+        key for key, entry in cache._entries.items()
+        if entry.query_vector is None or float(np.max(vectors @ entry.query_vector)) >= entry.min_score
+    }
+    
+    cache.chunks_added(vectors, [])
+    
+    assert expected
+    assert cache.invalidations == len(expected)
+    assert not expected & set(cache._entries)
+    assert cache.get("question 0", "scope") is not None
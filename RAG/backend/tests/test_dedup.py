@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from config import config
+from conftest import fake_embedding
+from database import db
+from dedup import chunk_deduplicator
+from filters import SearchFilter
+from ingestion import process_content
+from rag_pipeline import rag_pipeline
+
+def ingest_linked_pair(monkeypatch, tag: str):
+    """Two notes differing only in their first sentence; the second is linked to the first."""
+    monkeypatch.setattr(chunk_deduplicator, "mode", "link")
+    shared = " ".join(f"{tag}{i}" for i in range(150)) + "."
+    
+    async def run():
+        first = await process_content("An opener about zebras and their stripes. " + shared, "note")
+        second = await process_content("A different opener about quokkas smiling. " + shared, "note")
+        other = await process_content("An unrelated note about volcanoes erupting at night.", "note")
+        return first, second, other
+    
+    first, second, other = asyncio.run(run())
+    [canonical] = db.get_chunks_by_item_id(first)
+    [duplicate] = db.get_chunks_by_item_id(second)
+    assert duplicate["duplicate_of"] == canonical["id"]
+    return first, second, other
+
+@pytest.mark.skipif(not db.fts_enabled, reason="SQLite built without FTS5")
+def test_linked_duplicate_text_stays_retrievable(monkeypatch, fake_embeddings):
+    monkeypatch.setattr(config, "RETRIEVAL_MODE", "hybrid")
+    first, second, _ = ingest_linked_pair(monkeypatch, "r")
+    question = "quokkas smiling"
+    
+    async def run():
+        unfiltered, _ = await rag_pipeline.retrieve(question, fake_embedding(question), 5)
+        filtered, _ = await rag_pipeline.retrieve(
+            question, fake_embedding(question), 5, SearchFilter(item_ids=[second])
+        )
+        return unfiltered, filtered
+    
+    unfiltered, filtered = asyncio.run(run())
+    
+    # The duplicate has no embedding of its own; keyword search still finds its unique sentence
+    assert any(chunk_data['metadata']['item_id'] == second and "quokkas" in chunk_data['text']
+               for chunk_data, _ in unfiltered)
+    assert [chunk_data['metadata']['item_id'] for chunk_data, _ in filtered] == [second]
+
+def test_diversify_treats_linked_duplicate_as_its_original(monkeypatch, fake_embeddings):
+    first, second, other = ingest_linked_pair(monkeypatch, "d")
+    results = [
+        ({'text': chunk['chunk_text'], 'metadata': {
+            'chunk_id': chunk['id'], 'item_id': chunk['item_id'], 'duplicate_of': chunk['duplicate_of']
+        }}, score)
+        for item_id, score in ((first, 1.0), (second, 0.99), (other, 0.5))
+        for chunk in db.get_chunks_by_item_id(item_id)
+    ]
+    
+    picked = rag_pipeline.diversify(results, 2, 0.5, None)
+    
+    assert [chunk_data['metadata']['item_id'] for chunk_data, _ in picked] == [first, other]
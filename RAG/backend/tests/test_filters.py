@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pytest
+from config import config
+from filters import SearchFilter, to_timestamp
+from vector_store import VectorStore
+
+DIMENSION = 8
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+def build_store(rng):
+    """A store over 1100 rows (past the initial capacity) with a few items removed."""
+    store, live = VectorStore(), {}
+    for batch in range(2):
+        vectors = rng.standard_normal((550, DIMENSION)).astype(np.float32)
+        chunks = []
+        for position in range(550):
+            chunk_id = batch * 550 + position
+            created_at = START + timedelta(hours=int(rng.integers(0, 24 * 10)), minutes=int(rng.integers(0, 60)))
+            chunks.append({'text': f"chunk {chunk_id}", 'metadata': {
+                'chunk_id': chunk_id,
+                'item_id': chunk_id // 10,
+                'chunk_index': chunk_id % 10,
+                'source_type': "url" if (chunk_id // 10) % 3 else "note",
+                'created_at': created_at.strftime("%Y-%m-%d %H:%M:%S")
+            }})
+        store._append(vectors, chunks)
+        live.update(zip((chunk['metadata']['chunk_id'] for chunk in chunks), zip(VectorStore._normalize(vectors), chunks)))
+    
+    for item_id in (3, 4, 60):
+        store.remove_item(item_id)
+    store.remove_chunks([700, 701])
+    for chunk_id in [chunk_id for chunk_id in live if chunk_id // 10 in (3, 4, 60) or chunk_id in (700, 701)]:
+        del live[chunk_id]
+    return store, live
+
+def matches(metadata, search_filter):
+    created = to_timestamp(metadata['created_at'])
+    return ((search_filter.source_type is None or metadata['source_type'] == search_filter.source_type)
+            and (search_filter.item_ids is None or metadata['item_id'] in search_filter.item_ids)
+            and (search_filter.created_after is None or created >= to_timestamp(search_filter.created_after))
+            and (search_filter.created_before is None or created < to_timestamp(search_filter.created_before)))
+
+def brute_force(live, query, top_k, search_filter):
+    scored = [(float(vector @ query), chunk_id) for chunk_id, (vector, chunk) in live.items()
+              if matches(chunk['metadata'], search_filter)]
+    return [chunk_id for _, chunk_id in sorted(scored, reverse=True)[:top_k]]
+
+FILTERS = [
+    SearchFilter(source_type="note"),
+    SearchFilter(source_type="url"),
+    SearchFilter(source_type="missing"),
+    SearchFilter(item_ids=[1, 3, 50, 60, 70, 999]),
+    SearchFilter(created_after=START + timedelta(days=2, hours=5)),
+    SearchFilter(created_before=START + timedelta(days=1, hours=12, minutes=30)),
+    SearchFilter(created_after=START + timedelta(days=3), created_before=START + timedelta(days=4)),
+    SearchFilter(created_after=datetime(2024, 3, 5, 6, 15), created_before=datetime(2024, 3, 5, 18)),
+    SearchFilter(source_type="url", item_ids=list(range(0, 110, 7)), created_after=START + timedelta(days=5)),
+]
+
+@pytest.mark.parametrize("scan_max_rows", [0, 50000], ids=["index", "scan"])
+@pytest.mark.parametrize("search_filter", FILTERS)
+def test_filtered_search_matches_brute_force(index_type, monkeypatch, scan_max_rows, search_filter):
+    monkeypatch.setattr(config, "FILTER_SCAN_MAX_ROWS", scan_max_rows)
+    rng = np.random.default_rng(0)
+    store, live = build_store(rng)
+    
+    for _ in range(3):
+        query = VectorStore._normalize(rng.standard_normal(DIMENSION).astype(np.float32))
+        results = store._search_rows(query, 10, search_filter)
+        
+        assert [chunk['metadata']['chunk_id'] for chunk, _ in results] == brute_force(live, query, 10, search_filter)
+        assert all(matches(chunk['metadata'], search_filter) for chunk, _ in results)
+
+def test_filter_indexes_survive_compaction(index_type):
+    rng = np.random.default_rng(1)
+    store, live = build_store(rng)
+    store.compact()
+    
+    query = VectorStore._normalize(rng.standard_normal(DIMENSION).astype(np.float32))
+    for search_filter in FILTERS:
+        results = store._search_rows(query, 10, search_filter)
+        assert [chunk['metadata']['chunk_id'] for chunk, _ in results] == brute_force(live, query, 10, search_filter)
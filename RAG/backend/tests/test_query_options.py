@@ -0,0 +1,34 @@
+import asyncio
+from config import config
+from models import QueryRequest
+from rag_pipeline import rag_pipeline
+from vector_store import vector_store
+
+def test_max_chunks_per_item_zero_disables_cap():
+    request = QueryRequest(question="What changed?", max_chunks_per_item=0)
+    
+    mmr_lambda, max_chunks_per_item = rag_pipeline._diversity_options(1.0, request.max_chunks_per_item)
+    
+    assert max_chunks_per_item is None
+    assert rag_pipeline._pool_size(5, mmr_lambda, max_chunks_per_item) == 5
+
+def slow_embeddings(monkeypatch):
+    async def generate_query_embedding(query):
+        await asyncio.sleep(0.05)
+        return [1.0, 0.0]
+    
+    monkeypatch.setattr(vector_store, "generate_query_embedding", generate_query_embedding)
+    monkeypatch.setattr(config, "QUERY_EMBEDDING_TIMEOUT", 0.01)
+    monkeypatch.setattr(rag_pipeline, "_embedding_retry_at", 0.0)
+
+def test_slow_query_embedding_falls_back_to_lexical(monkeypatch):
+    slow_embeddings(monkeypatch)
+    monkeypatch.setattr(config, "RETRIEVAL_MODE", "hybrid")
+    
+    assert asyncio.run(rag_pipeline.embed_query("What changed?")) is None
+
+def test_slow_query_embedding_is_awaited_in_vector_mode(monkeypatch):
+    slow_embeddings(monkeypatch)
+    monkeypatch.setattr(config, "RETRIEVAL_MODE", "vector")
+    
+    assert asyncio.run(rag_pipeline.embed_query("What changed?")) == [1.0, 0.0]
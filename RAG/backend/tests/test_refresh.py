@@ -0,0 +1,61 @@
+import asyncio
+from database import db
+from dedup import chunk_deduplicator
+from http_client import FetchedPage
+from ingestion import content_ingestion, process_content, process_contents, refresh_url_item
+
+URL = "https://example.com/article"
+
+def paragraph(number: int, words: int = 300) -> str:
+    return " ".join(f"p{number}w{i}" for i in range(words)) + "."
+
+def serve(monkeypatch, pages):
+    """Answer fetches with the pages' texts in turn."""
+    pages = iter(pages)
+    
+    async def extract_url_content(url, etag=None, last_modified=None):
+        return True, FetchedPage(next(pages)), None
+    
+    monkeypatch.setattr(content_ingestion, "extract_url_content", extract_url_content)
+
+def test_refresh_in_skip_mode_keeps_edited_chunk(monkeypatch, fake_embeddings):
+    monkeypatch.setattr(chunk_deduplicator, "mode", "skip")
+    paragraphs = [paragraph(number) for number in range(5)]
+    edited = list(paragraphs)
+    edited[2] = edited[2].replace("p2w150", "edited")
+    serve(monkeypatch, ["\n\n".join(paragraphs), "\n\n".join(edited)])
+    
+    async def run():
+        item_id = await process_content(URL, "url")
+        before = db.get_chunks_by_item_id(item_id)
+        result = await refresh_url_item(item_id)
+        return before, result, db.get_chunks_by_item_id(item_id)
+    
+    before, result, after = asyncio.run(run())
+    
+    # The edited chunk is a near-duplicate of the one it replaces, but must not be skipped
+    assert result["status"] == "updated"
+    assert result["chunks_added"] == 1
+    assert result["chunks_removed"] == 1
+    assert len(after) == len(before)
+    assert any("edited" in chunk["chunk_text"] for chunk in after)
+    assert all(chunk["duplicate_of"] is None and chunk["embedding"] is not None for chunk in after)
+
+def test_bulk_lists_a_url_twice(monkeypatch, fake_embeddings):
+    url = "https://example.com/listed-twice"
+    serve(monkeypatch, [paragraph(7), paragraph(8), paragraph(9)])
+    
+    async def run():
+        new = await process_contents([(url, "url"), ("A note", "note"), (url, "url")])
+        known = await process_contents([(url, "url"), (url, "url")])
+        return new, known
+    
+    new, known = asyncio.run(run())
+    
+    # One item per URL; a known URL is refreshed once rather than failing its second listing
+    item_id = new[0][0]
+    assert item_id is not None
+    assert new[2] == (item_id, None)
+    assert new[1][0] not in (None, item_id)
+    assert known == [(item_id, None), (item_id, None)]
+    assert "p8w0" in db.get_item_by_id(item_id)["content"]
@@ -0,0 +1,119 @@
+import numpy as np
+import vector_store as vector_store_module
+from config import config
+from filters import SearchFilter
+from vector_store import VectorStore
+
+DIMENSION = 8
+
+def add_items(store, live, rng, item_ids, chunks_per_item=5):
+    """Append random chunks for the items, recording them in live by chunk id."""
+    vectors = rng.standard_normal((len(item_ids) * chunks_per_item, DIMENSION)).astype(np.float32)
+    chunks = []
+    for item_id in item_ids:
+        for chunk_index in range(chunks_per_item):
+            chunk_id = item_id * 100 + chunk_index
+            chunks.append({'text': f"chunk {chunk_id}", 'metadata': {
+                'chunk_id': chunk_id, 'item_id': item_id, 'chunk_index': chunk_index, 'source_type': "note"
+            }})
+    store._append(vectors, chunks)
+    for vector, chunk in zip(vectors, chunks):
+        live[chunk['metadata']['chunk_id']] = (vector, chunk)
+
+def remove_item(live, item_id):
+    for chunk_id in [chunk_id for chunk_id, (_, chunk) in live.items() if chunk['metadata']['item_id'] == item_id]:
+        del live[chunk_id]
+
+def search(store, query, search_filter=None):
+    return [(chunk['metadata']['chunk_id'], round(score, 5))
+            for chunk, score in store._search_rows(query, 10, search_filter)]
+
+def assert_matches_rebuilt_store(store, live, rng):
+    rebuilt = VectorStore()
+    if live:
+        rebuilt._append(np.vstack([vector for vector, _ in live.values()]),
+                        [chunk for _, chunk in live.values()])
+    
+    assert store.size() == rebuilt.size() == len(live)
+    item_ids = sorted({chunk['metadata']['item_id'] for _, chunk in live.values()})[:3]
+    for _ in range(5):
+        query = VectorStore._normalize(rng.standard_normal(DIMENSION).astype(np.float32))
+        assert search(store, query) == search(rebuilt, query)
+        assert search(store, query, SearchFilter(item_ids=item_ids)) == search(rebuilt, query, SearchFilter(item_ids=item_ids))
+
+def test_deletes_past_threshold_compact_to_rebuilt_store(index_type, monkeypatch):
+    monkeypatch.setattr(config, "VECTOR_COMPACTION_MIN_DEAD", 1)
+    monkeypatch.setattr(config, "VECTOR_COMPACTION_THRESHOLD", 0.2)
+    rng = np.random.default_rng(0)
+    store, live = VectorStore(), {}
+    add_items(store, live, rng, range(20))
+    
+    for item_id in range(3):
+        store.remove_item(item_id)
+        remove_item(live, item_id)
+    assert store._count == 100 and store._dead_count == 15
+    assert_matches_rebuilt_store(store, live, rng)
+    
+    # The fourth item takes tombstones to 20% and compacts inline (no event loop)
+    store.remove_item(3)
+    remove_item(live, 3)
+    assert store._count == 80 and store._dead_count == 0
+    assert_matches_rebuilt_store(store, live, rng)
+    
+    store.remove_chunks([401, 402, 999])
+    del live[401], live[402]
+    store.compact()
+    assert store._count == 78 and store._dead_count == 0
+    assert_matches_rebuilt_store(store, live, rng)
+
+def test_compaction_folds_in_rows_changed_meanwhile(index_type, monkeypatch):
+    rng = np.random.default_rng(1)
+    store, live = VectorStore(), {}
+    add_items(store, live, rng, range(10))
+    for item_id in range(3):
+        store.remove_item(item_id)
+        remove_item(live, item_id)
+    
+    create_index = vector_store_module.create_index
+    
+    def create_index_during_compaction(index_type=None):
+        # Runs after the snapshot is taken, before the swap
+        monkeypatch.setattr(vector_store_module, "create_index", create_index)
+        add_items(store, live, rng, range(10, 14))
+        store.remove_item(5)
+        remove_item(live, 5)
+        return create_index(index_type)
+    
+    monkeypatch.setattr(vector_store_module, "create_index", create_index_during_compaction)
+    store.compact()
+    
+    # Appended rows are kept; the row deleted after the snapshot stays tombstoned
+    assert store._count == 55 and store._dead_count == 5
+    assert_matches_rebuilt_store(store, live, rng)
+    
+    store.compact()
+    assert store._count == 50 and store._dead_count == 0
+    assert_matches_rebuilt_store(store, live, rng)
+
+def test_compaction_is_discarded_after_clear(index_type, monkeypatch):
+    rng = np.random.default_rng(2)
+    store, live = VectorStore(), {}
+    add_items(store, live, rng, range(10))
+    store.remove_item(0)
+    
+    create_index = vector_store_module.create_index
+    
+    def create_index_during_compaction(index_type=None):
+        monkeypatch.setattr(vector_store_module, "create_index", create_index)
+        store.clear()
+        return create_index(index_type)
+    
+    monkeypatch.setattr(vector_store_module, "create_index", create_index_during_compaction)
+    store.compact()
+    
+    live.clear()
+    assert store._count == 0
+    assert_matches_rebuilt_store(store, live, rng)
+    
+    add_items(store, live, rng, range(20, 25))
+    assert_matches_rebuilt_store(store, live, rng)
@@ -0,0 +1,228 @@
+import numpy as np
+from typing import List, Optional, Tuple
+from config import config
+from logger import logger
+
+class VectorIndex:
+    """
+    Base class for nearest-neighbour indexes behind the vector store.
+    
+    Indexes work on L2-normalized float32 vectors addressed by their row in
+    the vector store's matrix, and score by inner product (cosine similarity).
+    """
+    
+    name = "base"
+    
+    def add(self, vectors: np.ndarray, rows: np.ndarray):
+        """Index vectors under the given store rows."""
+        raise NotImplementedError
+    
+    def search(self, query: np.ndarray, k: int, vectors: np.ndarray,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k rows most similar to the query.
+        
+        Args:
+            query: Normalized query vector
+            k: Number of results to return
+            vectors: The store's normalized matrix, used by exact search
+            mask: Optional boolean array over rows; only True rows are returned
+        
+        Returns:
+            Tuple of (rows, scores) ordered by descending score
+        """
+        raise NotImplementedError
+    
+    def reset(self):
+        """Drop everything from the index."""
+        raise NotImplementedError
+
+
+def exact_search(query: np.ndarray, k: int, vectors: np.ndarray,
+                 mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Brute-force top-k by inner product over a matrix of vectors."""
+    if not len(vectors):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    
+    # Cosine similarity against every row in one product
+    similarities = vectors @ query
+    if mask is not None:
+        similarities = np.where(mask, similarities, -np.inf)
+    
+    # Select the top k without sorting the whole score array
+    k = min(k, len(similarities))
+    top_rows = np.argpartition(-similarities, k - 1)[:k]
+    top_rows = top_rows[np.argsort(-similarities[top_rows])]
+    
+    # Masked-out rows sort last; drop them if fewer than k rows were eligible
+    top_rows = top_rows[np.isfinite(similarities[top_rows])]
+    return top_rows, similarities[top_rows]
+
+
+class FlatIndex(VectorIndex):
+    """Exact search that scans the vector store's matrix directly."""
+    
+    name = "flat"
+    
+    def add(self, vectors: np.ndarray, rows: np.ndarray):
+        pass
+    
+    def search(self, query: np.ndarray, k: int, vectors: np.ndarray,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return exact_search(query, k, vectors, mask)
+    
+    def reset(self):
+        pass
+
+
+class HNSWIndex(VectorIndex):
+    """Approximate search over an hnswlib HNSW graph."""
+    
+    name = "hnsw"
+    
+    def __init__(self):
+        import hnswlib
+        self._hnswlib = hnswlib
+        self._index = None
+    
+    def _create(self, dimension: int, capacity: int):
+        self._index = self._hnswlib.Index(space='ip', dim=dimension)
+        self._index.init_index(
+            max_elements=capacity,
+            ef_construction=config.HNSW_EF_CONSTRUCTION,
+            M=config.HNSW_M
+        )
+        self._index.set_ef(config.HNSW_EF_SEARCH)
+    
+    def add(self, vectors: np.ndarray, rows: np.ndarray):
+        if self._index is None:
+            self._create(vectors.shape[1], max(len(vectors), 1024))
+        
+        needed = self._index.get_current_count() + len(vectors)
+        capacity = self._index.get_max_elements()
+        if needed > capacity:
+            self._index.resize_index(max(needed, 2 * capacity))
+        
+        self._index.add_items(vectors, rows)
+    
+    def search(self, query: np.ndarray, k: int, vectors: np.ndarray,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if self._index is None or not self._index.get_current_count():
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        
+        eligible = self._index.get_current_count() if mask is None else int(mask.sum())
+        k = min(k, eligible)
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        
+        self._index.set_ef(max(config.HNSW_EF_SEARCH, k))
+        if mask is None:
+            labels, distances = self._index.knn_query(query.reshape(1, -1), k=k)
+        else:
+            # Masked-out nodes are still traversed but never returned
+            labels, distances = self._index.knn_query(
+                query.reshape(1, -1), k=k, num_threads=1,
+                filter=lambda label: bool(mask[label])
+            )
+        
+        # hnswlib's inner-product distance is 1 - dot
+        return labels[0].astype(np.int64), 1.0 - distances[0]
+    
+    def reset(self):
+        self._index = None
+
+
+class IVFIndex(VectorIndex):
+    """
+    Approximate search over a FAISS inverted-file index.
+    
+    IVF needs enough vectors to train its coarse centroids, so vectors are
+    buffered and searched exactly until IVF_MIN_TRAIN_SIZE is reached.
+    """
+    
+    name = "faiss"
+    
+    def __init__(self):
+        import faiss
+        self._faiss = faiss
+        self._index = None
+        self._pending: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._pending_count = 0
+    
+    def _train(self):
+        vectors = np.vstack([v for v, _ in self._pending])
+        rows = np.concatenate([r for _, r in self._pending])
+        nlist = min(config.IVF_NLIST, len(vectors))
+        
+        quantizer = self._faiss.IndexFlatIP(vectors.shape[1])
+        index = self._faiss.IndexIVFFlat(quantizer, vectors.shape[1], nlist, self._faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.add_with_ids(vectors, rows)
+        index.nprobe = config.IVF_NPROBE
+        
+        self._index = index
+        self._pending = []
+        self._pending_count = 0
+        logger.info(f"Trained IVF index with {nlist} lists on {len(vectors)} vectors")
+    
+    def add(self, vectors: np.ndarray, rows: np.ndarray):
+        if self._index is not None:
+            self._index.add_with_ids(vectors, rows.astype(np.int64))
+            return
+        
+        self._pending.append((vectors.copy(), rows.astype(np.int64)))
+        self._pending_count += len(vectors)
+        if self._pending_count >= config.IVF_MIN_TRAIN_SIZE:
+            self._train()
+    
+    def search(self, query: np.ndarray, k: int, vectors: np.ndarray,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if self._index is None:
+            return exact_search(query, k, vectors, mask)
+        
+        if mask is None:
+            scores, labels = self._index.search(query.reshape(1, -1), k)
+        else:
+            # Restrict the scan to masked-in ids with a bitmap selector
+            bitmap = np.packbits(mask, bitorder='little')
+            params = self._faiss.SearchParametersIVF(
+                sel=self._faiss.IDSelectorBitmap(len(mask), self._faiss.swig_ptr(bitmap)),
+                nprobe=config.IVF_NPROBE
+            )
+            scores, labels = self._index.search(query.reshape(1, -1), k, params=params)
+        found = labels[0] >= 0
+        return labels[0][found], scores[0][found]
+    
+    def reset(self):
+        self._index = None
+        self._pending = []
+        self._pending_count = 0
+
+
+INDEX_TYPES = {
+    FlatIndex.name: FlatIndex,
+    HNSWIndex.name: HNSWIndex,
+    IVFIndex.name: IVFIndex
+}
+
+def create_index(index_type: str = None) -> VectorIndex:
+    """
+    Create the index backend named by VECTOR_STORE_TYPE.
+    
+    Falls back to exact flat search when the type is unknown or its
+    library is not installed.
+    """
+    index_type = (index_type or config.VECTOR_STORE_TYPE).lower()
+    index_class = INDEX_TYPES.get(index_type)
+    
+    if index_class is None:
+        logger.warning(f"Unknown vector store type '{index_type}', using flat index")
+        return FlatIndex()
+    
+    try:
+        index = index_class()
+        logger.info(f"Using {index.name} vector index")
+        return index
+    except ImportError as e:
+        logger.warning(f"Vector store type '{index_type}' unavailable ({e}), using flat index")
+        return FlatIndex()
@@ -1,19 +1,63 @@
-from openai import AzureOpenAI
-from typing import List, Tuple, Dict, Any
+import asyncio
+import threading
+import numpy as np
+from openai import AsyncAzureOpenAI
+from collections import Counter
+from typing import List, Tuple, Dict, Any, Optional, Sequence, Callable, Awaitable
 from config import config
 from logger import logger
+from database import decode_embedding
+from filters import SearchFilter, to_timestamp
+from vector_index import create_index, exact_search
+from embedding_cache import embedding_cache
 
 class VectorStore:
-    """Simple in-memory vector store using cosine similarity for search."""
+    """
+    In-memory vector store using cosine similarity for search.
+    
+    Embeddings are kept L2-normalized in a contiguous float32 matrix. Search
+    goes through the index backend selected by VECTOR_STORE_TYPE, which is
+    either an exact scan of that matrix or an approximate graph/IVF index.
+    
+    Deletes only flip a tombstone bit for the affected rows; once enough rows
+    are dead a background compaction rewrites the matrix and index without them.
+    
+    Filtered searches build a row mask from per-source_type bitmaps, the item
+    row map and per-day row buckets, so only matching rows are scored.
+    """
+    
+    INITIAL_CAPACITY = 1024
+    SECONDS_PER_DAY = 86400
     
     def __init__(self):
-        self.embeddings: List[List[float]] = []
-        self.chunks: List[Dict[str, Any]] = []
+        self.chunks: List[Optional[Dict[str, Any]]] = []
         self.dimension: int = config.EMBEDDING_DIMENSION  # Azure text-embedding-ada-002: 1536
+        self._matrix = np.empty((0, self.dimension), dtype=np.float32)
+        self._count = 0
+        self.index = create_index()
+        
+        # Row bookkeeping for deletes: alive bitmap plus id -> row maps
+        self._alive = np.zeros(0, dtype=bool)
+        self._dead_count = 0
+        self._chunk_rows: Dict[int, int] = {}
+        self._item_rows: Dict[int, List[int]] = {}
+        self._generation = 0
+        self._compaction_task: Optional[asyncio.Task] = None
+        
+        # Filter pushdown: source_type -> row bitmap, created_at per row, day -> rows
+        self._source_rows: Dict[str, np.ndarray] = {}
+        self._created = np.zeros(0, dtype=np.float64)
+        self._day_rows: Dict[int, List[int]] = {}
+        
+        # Objects notified via chunks_added(vectors, metadatas) / chunks_removed(item_ids)
+        self.listeners: List[Any] = []
+        
+        # Searches run in worker threads, so guard the matrix and index
+        self._lock = threading.RLock()
         
         # Configure Azure OpenAI client
         if config.AZURE_OPENAI_API_KEY and config.AZURE_OPENAI_ENDPOINT:
-            self.client = AzureOpenAI(
+            self.client = AsyncAzureOpenAI(
                 api_key=config.AZURE_OPENAI_API_KEY,
                 api_version=config.AZURE_OPENAI_API_VERSION,
                 azure_endpoint=config.AZURE_OPENAI_ENDPOINT
@@ -23,104 +67,491 @@ class VectorStore:
             self.client = None
             logger.warning("Azure OpenAI credentials not set - embeddings will fail")
     
-    def generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding for text using Azure OpenAI."""
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Rough token count (~4 characters per token) for request packing."""
+        return len(text) // 4 + 1
+    
+    def _batches(self, texts: List[str]) -> List[List[int]]:
+        """Group text indices into requests bounded by item count and token budget."""
+        batches = []
+        current = []
+        current_tokens = 0
+        
+        for idx, text in enumerate(texts):
+            tokens = self._estimate_tokens(text)
+            if current and (len(current) >= config.EMBEDDING_BATCH_SIZE
+                            or current_tokens + tokens > config.EMBEDDING_BATCH_TOKENS):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(idx)
+            current_tokens += tokens
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    async def generate_embeddings(self, texts: List[str],
+                                  on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+                                  ) -> List[Sequence[float]]:
+        """
+        Generate embeddings for many texts using batched Azure OpenAI requests.
+        
+        Texts already in the embedding cache are served from it; the rest are
+        deduplicated and packed into requests of at most EMBEDDING_BATCH_SIZE
+        inputs and roughly EMBEDDING_BATCH_TOKENS tokens each.
+        
+        If given, on_progress is awaited with (texts_embedded, total_texts)
+        after the cache lookup and after every request.
+        
+        Returns:
+            Embeddings in the same order as the input texts
+        """
         try:
-            if not self.client:
-                raise ValueError("Azure OpenAI client not configured")
+            deployment = config.AZURE_OPENAI_EMBEDDING_DEPLOYMENT
+            keys = [embedding_cache.key(deployment, text) for text in texts]
+            cached = await embedding_cache.get_many_async(keys)
             
-            response = self.client.embeddings.create(
-                input=text,
-                model=config.AZURE_OPENAI_EMBEDDING_DEPLOYMENT
-            )
-            embedding = response.data[0].embedding
-            logger.debug(f"Generated embedding with dimension {len(embedding)}")
-            return embedding
+            # Embed each distinct uncached text once
+            pending = {}
+            for key, text in zip(keys, texts):
+                if key not in cached and key not in pending:
+                    pending[key] = text
+            
+            if on_progress:
+                copies = Counter(keys)
+                done = len(texts) - sum(copies[key] for key in pending)
+                await on_progress(done, len(texts))
+            
+            if pending:
+                if not self.client:
+                    raise ValueError("Azure OpenAI client not configured")
+                
+                pending_keys = list(pending)
+                pending_texts = list(pending.values())
+                fresh = {}
+                batches = self._batches(pending_texts)
+                
+                for batch in batches:
+                    response = await self.client.embeddings.create(
+                        input=[pending_texts[idx] for idx in batch],
+                        model=deployment
+                    )
+                    for item in response.data:
+                        fresh[pending_keys[batch[item.index]]] = item.embedding
+                    
+                    if on_progress:
+                        done += sum(copies[pending_keys[idx]] for idx in batch)
+                        await on_progress(done, len(texts))
+                
+                await embedding_cache.put_many_async(fresh)
+                cached.update(fresh)
+                logger.debug(f"Generated {len(pending)} embeddings in {len(batches)} requests")
+            
+            return [cached[key] for key in keys]
         except Exception as e:
-            logger.error(f"Error generating embedding: {e}")
+            logger.error(f"Error generating embeddings: {e}")
             raise
     
-    def generate_query_embedding(self, query: str) -> List[float]:
+    async def generate_embedding(self, text: str) -> Sequence[float]:
+        """Generate embedding for text using Azure OpenAI."""
+        return (await self.generate_embeddings([text]))[0]
+    
+    async def generate_query_embedding(self, query: str) -> Sequence[float]:
         """Generate embedding for a query using Azure OpenAI."""
         # For Azure OpenAI, query and document embeddings use the same method
-        return self.generate_embedding(query)
+        return await self.generate_embedding(query)
+    
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize vectors row-wise, leaving zero vectors untouched."""
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+    
+    def _append(self, vectors: np.ndarray, chunks: List[Dict[str, Any]]) -> np.ndarray:
+        """Append normalized vectors to the matrix, growing it geometrically."""
+        with self._lock:
+            if vectors.shape[1] != self.dimension:
+                if self._count:
+                    raise ValueError(
+                        f"Embedding dimension {vectors.shape[1]} does not match "
+                        f"vector store dimension {self.dimension}"
+                    )
+                logger.warning(
+                    f"Embedding dimension {vectors.shape[1]} differs from configured "
+                    f"{self.dimension}; adopting {vectors.shape[1]}"
+                )
+                self.dimension = vectors.shape[1]
+                self._matrix = np.empty((0, self.dimension), dtype=np.float32)
+            
+            needed = self._count + len(vectors)
+            if needed > len(self._matrix):
+                capacity = max(needed, 2 * len(self._matrix), self.INITIAL_CAPACITY)
+                grown = np.empty((capacity, self.dimension), dtype=np.float32)
+                grown[:self._count] = self._matrix[:self._count]
+                self._matrix = grown
+                self._alive = self._grow(self._alive, capacity)
+                self._created = self._grow(self._created, capacity, np.nan)
+                for source_type, bitmap in self._source_rows.items():
+                    self._source_rows[source_type] = self._grow(bitmap, capacity)
+            
+            normalized = self._normalize(vectors)
+            self._matrix[self._count:needed] = normalized
+            self._alive[self._count:needed] = True
+            self.index.add(normalized, np.arange(self._count, needed))
+            
+            for row, chunk in enumerate(chunks, start=self._count):
+                self._register_row(row, chunk)
+            self._count = needed
+            self.chunks.extend(chunks)
+            return normalized
+    
+    def _append_and_notify(self, vectors: np.ndarray, chunks: List[Dict[str, Any]]):
+        """Append rows and tell listeners about them; listener work stays off the event loop."""
+        normalized = self._append(vectors, chunks)
+        for listener in self.listeners:
+            listener.chunks_added(normalized, [chunk['metadata'] for chunk in chunks])
     
-    def add_chunk(self, chunk_text: str, chunk_metadata: Dict[str, Any]):
-        """Add a chunk and its embedding to the vector store."""
+    def _grow(self, array: np.ndarray, capacity: int, fill=0) -> np.ndarray:
+        """Copy a per-row array into a larger one, padding with fill."""
+        grown = np.full(capacity, fill, dtype=array.dtype)
+        grown[:self._count] = array[:self._count]
+        return grown
+    
+    def _register_row(self, row: int, chunk: Dict[str, Any]):
+        """Record a row in the lookup maps and filter bitmaps."""
+        metadata = chunk['metadata']
+        self._chunk_rows[metadata['chunk_id']] = row
+        self._item_rows.setdefault(metadata['item_id'], []).append(row)
+        
+        bitmap = self._source_rows.get(metadata['source_type'])
+        if bitmap is None:
+            bitmap = self._source_rows[metadata['source_type']] = np.zeros(len(self._alive), dtype=bool)
+        bitmap[row] = True
+        
+        created = to_timestamp(metadata.get('created_at'))
+        if created is not None:
+            self._created[row] = created
+            self._day_rows.setdefault(int(created // self.SECONDS_PER_DAY), []).append(row)
+    
+    async def add_chunks(self, chunk_texts: List[str], chunk_metadatas: List[Dict[str, Any]],
+                         embeddings: Optional[List[Sequence[float]]] = None) -> List[Sequence[float]]:
+        """
+        Add many chunks and their embeddings to the vector store.
+        
+        Embeddings are generated in batches unless precomputed ones are passed in.
+        
+        Returns:
+            The embeddings stored for the chunks, in input order
+        """
+        if not chunk_texts:
+            return []
+        
         try:
-            embedding = self.generate_embedding(chunk_text)
-            self.embeddings.append(embedding)
-            self.chunks.append({
-                'text': chunk_text,
-                'metadata': chunk_metadata
-            })
-            logger.info(f"Added chunk {chunk_metadata.get('chunk_id')} to vector store")
+            if embeddings is None:
+                embeddings = await self.generate_embeddings(chunk_texts)
+            await asyncio.to_thread(
+                self._append_and_notify,
+                np.asarray(embeddings, dtype=np.float32),
+                [
+                    {'text': text, 'metadata': metadata}
+                    for text, metadata in zip(chunk_texts, chunk_metadatas)
+                ]
+            )
+            logger.info(f"Added {len(chunk_texts)} chunks to vector store")
+            return embeddings
         except Exception as e:
-            logger.error(f"Error adding chunk to vector store: {e}")
+            logger.error(f"Error adding chunks to vector store: {e}")
             raise
     
-    def cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors."""
-        import math
+    async def add_chunk(self, chunk_text: str, chunk_metadata: Dict[str, Any],
+                        embedding: Optional[Sequence[float]] = None) -> Sequence[float]:
+        """
+        Add a chunk and its embedding to the vector store.
+        
+        The embedding is generated unless a precomputed one is passed in.
+        
+        Returns:
+            The embedding stored for the chunk
+        """
+        embeddings = None if embedding is None else [embedding]
+        return (await self.add_chunks([chunk_text], [chunk_metadata], embeddings))[0]
+    
+    def _time_mask(self, after: Optional[float], before: Optional[float]) -> np.ndarray:
+        """Rows created in [after, before), read from the per-day buckets."""
+        low = -np.inf if after is None else after
+        high = np.inf if before is None else before
+        selected = np.zeros(self._count, dtype=bool)
+        
+        for day, rows in self._day_rows.items():
+            start = day * self.SECONDS_PER_DAY
+            end = start + self.SECONDS_PER_DAY
+            if end <= low or start >= high:
+                continue
+            if low <= start and end <= high:
+                selected[rows] = True
+            else:
+                # Only days straddling a bound need per-row timestamps
+                rows = np.asarray(rows)
+                created = self._created[rows]
+                selected[rows[(created >= low) & (created < high)]] = True
+        return selected
+    
+    def _filter_mask(self, search_filter: SearchFilter) -> np.ndarray:
+        """Build the mask of live rows matching a filter (caller holds the lock)."""
+        mask = self._alive[:self._count].copy()
         
-        dot_product = sum(a * b for a, b in zip(vec1, vec2))
-        norm1 = math.sqrt(sum(a * a for a in vec1))
-        norm2 = math.sqrt(sum(b * b for b in vec2))
+        if search_filter.source_type is not None:
+            bitmap = self._source_rows.get(search_filter.source_type)
+            if bitmap is None:
+                return np.zeros(self._count, dtype=bool)
+            mask &= bitmap[:self._count]
         
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
+        if search_filter.item_ids is not None:
+            selected = np.zeros(self._count, dtype=bool)
+            selected[[row for item_id in search_filter.item_ids
+                      for row in self._item_rows.get(item_id, ())]] = True
+            mask &= selected
         
-        return dot_product / (norm1 * norm2)
+        if search_filter.created_after is not None or search_filter.created_before is not None:
+            mask &= self._time_mask(
+                to_timestamp(search_filter.created_after),
+                to_timestamp(search_filter.created_before)
+            )
+        return mask
+    
+    def _search_rows(self, query_vector: np.ndarray, top_k: int,
+                     search_filter: Optional[SearchFilter] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Run the index search under the store lock (called off the event loop)."""
+        with self._lock:
+            if search_filter is None or search_filter.is_empty():
+                # Only pay for the tombstone mask when something has been deleted
+                mask = self._alive[:self._count] if self._dead_count else None
+                rows, scores = self.index.search(query_vector, top_k, self._matrix[:self._count], mask)
+            else:
+                mask = self._filter_mask(search_filter)
+                candidates = np.flatnonzero(mask)
+                if len(candidates) <= config.FILTER_SCAN_MAX_ROWS:
+                    # Selective filter: score just the matching rows exactly
+                    rows, scores = exact_search(query_vector, top_k, self._matrix[candidates])
+                    rows = candidates[rows]
+                else:
+                    rows, scores = self.index.search(query_vector, top_k, self._matrix[:self._count], mask)
+            return [(self.chunks[row], float(score)) for row, score in zip(rows, scores)]
     
-    def search(self, query: str, top_k: int = 5) -> List[Tuple[Dict[str, Any], float]]:
+    async def search_by_embedding(self, query_embedding: Sequence[float], top_k: int = 5,
+                                  search_filter: Optional[SearchFilter] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Search for the chunks most similar to a precomputed query embedding.
+        
+        An optional filter restricts the search to matching chunks before scoring.
+        """
+        if not self.size():
+            logger.warning("Vector store is empty")
+            return []
+        
+        query_vector = self._normalize(np.asarray(query_embedding, dtype=np.float32))
+        
+        # Scoring is CPU-bound; keep it off the event loop
+        results = await asyncio.to_thread(self._search_rows, query_vector, top_k, search_filter)
+        logger.info(f"Found {len(results)} results for query")
+        return results
+    
+    async def search(self, query: str, top_k: int = 5,
+                     search_filter: Optional[SearchFilter] = None) -> List[Tuple[Dict[str, Any], float]]:
         """Search for most similar chunks to the query."""
-        if not self.embeddings:
+        if not self.size():
             logger.warning("Vector store is empty")
             return []
         
         try:
-            query_embedding = self.generate_query_embedding(query)
-            
-            # Calculate similarities
-            similarities = []
-            for idx, chunk_embedding in enumerate(self.embeddings):
-                similarity = self.cosine_similarity(query_embedding, chunk_embedding)
-                similarities.append((idx, similarity))
+            query_embedding = await self.generate_query_embedding(query)
+            return await self.search_by_embedding(query_embedding, top_k, search_filter)
             
-            # Sort by similarity (descending)
-            similarities.sort(key=lambda x: x[1], reverse=True)
+        except Exception as e:
+            logger.error(f"Error during search: {e}")
+            raise
+    
+    def get_embeddings(self, chunk_ids: List[int]) -> np.ndarray:
+        """Normalized embeddings of chunks by id, as matrix rows; zeros for chunks not in the store."""
+        with self._lock:
+            vectors = np.zeros((len(chunk_ids), self.dimension), dtype=np.float32)
+            positions = [position for position, chunk_id in enumerate(chunk_ids) if chunk_id in self._chunk_rows]
+            rows = [self._chunk_rows[chunk_ids[position]] for position in positions]
+            vectors[positions] = self._matrix[rows]
+            return vectors
+    
+    def _remove_rows(self, item_id: Optional[int] = None, chunk_ids: Sequence[int] = ()) -> int:
+        """
+        Tombstone an item's rows or specific chunks' rows; returns how many were alive.
+        
+        Ids are resolved to rows under the same lock acquisition as the
+        tombstoning, so a compaction renumbering rows can't slip in between.
+        """
+        item_ids = set()
+        with self._lock:
+            if item_id is not None:
+                rows = list(self._item_rows.get(item_id, []))
+            else:
+                rows = [self._chunk_rows[chunk_id] for chunk_id in chunk_ids if chunk_id in self._chunk_rows]
+            removed = 0
+            for row in rows:
+                if row < self._count and self._alive[row]:
+                    self._alive[row] = False
+                    metadata = self.chunks[row]['metadata']
+                    item_ids.add(metadata['item_id'])
+                    self._chunk_rows.pop(metadata['chunk_id'], None)
+                    item_rows = self._item_rows.get(metadata['item_id'])
+                    if item_rows is not None:
+                        item_rows.remove(row)
+                        if not item_rows:
+                            del self._item_rows[metadata['item_id']]
+                    self.chunks[row] = None
+                    removed += 1
+            self._dead_count += removed
+        
+        if item_ids:
+            for listener in self.listeners:
+                listener.chunks_removed(item_ids)
+        return removed
+    
+    def remove_item(self, item_id: int) -> int:
+        """
+        Remove all chunks of an item from search results.
+        
+        Rows are tombstoned in O(1) each and reclaimed by a later compaction.
+        
+        Returns:
+            Number of chunks removed
+        """
+        removed = self._remove_rows(item_id=item_id)
+        if removed:
+            logger.info(f"Removed {removed} chunks of item {item_id} from vector store")
+            self._maybe_compact()
+        return removed
+    
+    def remove_chunks(self, chunk_ids: List[int]) -> int:
+        """Remove specific chunks from search results by chunk id."""
+        removed = self._remove_rows(chunk_ids=chunk_ids)
+        if removed:
+            logger.info(f"Removed {removed} chunks from vector store")
+            self._maybe_compact()
+        return removed
+    
+    def update_chunk_indexes(self, chunk_indexes: List[Tuple[int, int]]):
+        """Record new positions, as (chunk_id, chunk_index), for chunks kept across a re-fetch."""
+        with self._lock:
+            for chunk_id, chunk_index in chunk_indexes:
+                row = self._chunk_rows.get(chunk_id)
+                if row is not None:
+                    self.chunks[row]['metadata']['chunk_index'] = chunk_index
+    
+    def _maybe_compact(self):
+        """Schedule a background compaction once tombstones pass the threshold."""
+        if self._dead_count < config.VECTOR_COMPACTION_MIN_DEAD:
+            return
+        if self._dead_count < config.VECTOR_COMPACTION_THRESHOLD * self._count:
+            return
+        if self._compaction_task is not None and not self._compaction_task.done():
+            return
+        
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (e.g. scripts); compact inline
+            self.compact()
+            return
+        self._compaction_task = loop.create_task(asyncio.to_thread(self.compact))
+    
+    def compact(self):
+        """
+        Rewrite the matrix and index without tombstoned rows.
+        
+        The new index is built from a snapshot outside the lock so searches
+        keep running; rows added or deleted meanwhile are folded in at swap time.
+        """
+        with self._lock:
+            generation = self._generation
+            snapshot_count = self._count
+            keep = np.flatnonzero(self._alive[:snapshot_count])
+            vectors = self._matrix[keep]
+        
+        # Building the index is the slow part; do it without holding the lock
+        index = create_index(self.index.name)
+        index.add(vectors, np.arange(len(keep)))
+        
+        with self._lock:
+            if generation != self._generation:
+                logger.info("Vector store changed during compaction; discarding result")
+                return
             
-            # Get top k results
-            top_results = similarities[:top_k]
+            # Fold in rows appended since the snapshot
+            tail = np.arange(snapshot_count, self._count)
+            order = np.concatenate([keep, tail])
+            if len(tail):
+                index.add(self._matrix[tail], np.arange(len(keep), len(order)))
             
-            results = []
-            for idx, score in top_results:
-                results.append((self.chunks[idx], score))
+            capacity = max(len(order), self.INITIAL_CAPACITY)
+            matrix = np.empty((capacity, self.dimension), dtype=np.float32)
+            matrix[:len(order)] = self._matrix[order]
+            alive = np.zeros(capacity, dtype=bool)
+            alive[:len(order)] = self._alive[order]
+            chunks = [self.chunks[row] for row in order]
             
-            logger.info(f"Found {len(results)} results for query")
-            return results
+            self._matrix = matrix
+            self._alive = alive
+            self._count = len(order)
+            self.chunks = chunks
+            self.index = index
             
-        except Exception as e:
-            logger.error(f"Error during search: {e}")
-            raise
+            # Rows deleted after the snapshot are still tombstoned
+            self._dead_count = int(len(order) - alive[:len(order)].sum())
+            self._chunk_rows = {}
+            self._item_rows = {}
+            self._source_rows = {}
+            self._created = np.full(capacity, np.nan)
+            self._day_rows = {}
+            for row, chunk in enumerate(chunks):
+                if chunk is not None and alive[row]:
+                    self._register_row(row, chunk)
+            logger.info(f"Compacted vector store to {self._count} rows")
     
     def clear(self):
         """Clear all embeddings and chunks from the store."""
-        self.embeddings = []
-        self.chunks = []
+        with self._lock:
+            self._matrix = np.empty((0, self.dimension), dtype=np.float32)
+            self._alive = np.zeros(0, dtype=bool)
+            self._count = 0
+            self._dead_count = 0
+            self._chunk_rows = {}
+            self._item_rows = {}
+            self._source_rows = {}
+            self._created = np.zeros(0, dtype=np.float64)
+            self._day_rows = {}
+            self._generation += 1
+            self.index.reset()
+            self.chunks = []
         logger.info("Vector store cleared")
     
     def size(self) -> int:
-        """Return the number of chunks in the store."""
-        return len(self.chunks)
+        """Return the number of live chunks in the store."""
+        return self._count - self._dead_count
     
-    def reload_from_database(self, db):
-        """Reload all chunks from database and regenerate embeddings."""
+    async def reload_from_database(self, db):
+        """
+        Reload all chunks from the database.
+        
+        Stored embeddings are loaded as-is; only chunks without an embedding,
+        or with one produced by a different embedding deployment, are
+        re-embedded and written back.
+        """
         try:
             logger.info("Reloading vector store from database...")
             
             # Get all chunks from database
-            all_chunks = db.get_all_chunks()
+            all_chunks = await db.run_in_thread(db.get_all_chunks)
             
             if not all_chunks:
                 logger.info("No chunks found in database")
@@ -129,18 +560,46 @@ class VectorStore:
             # Clear existing data
             self.clear()
             
-            # Regenerate embeddings for each chunk
-            for chunk in all_chunks:
-                chunk_metadata = {
-                    'chunk_id': chunk['id'],
-                    'item_id': chunk['item_id'],
-                    'chunk_index': chunk['chunk_index']
-                }
+            model = config.AZURE_OPENAI_EMBEDDING_DEPLOYMENT
+            chunks = []
+            vectors = []
+            stale = []
+            
+            for position, chunk in enumerate(all_chunks):
+                chunks.append({
+                    'text': chunk['chunk_text'],
+                    'metadata': {
+                        'chunk_id': chunk['id'],
+                        'item_id': chunk['item_id'],
+                        'chunk_index': chunk['chunk_index'],
+                        'source_type': chunk['source_type'],
+                        'url': chunk['url'],
+                        'created_at': chunk['item_created_at']
+                    }
+                })
                 
-                # Add chunk with its embedding
-                self.add_chunk(chunk['chunk_text'], chunk_metadata)
+                # Re-embed only if no usable vector was stored
+                if chunk['embedding'] is not None and chunk['embedding_model'] == model:
+                    vectors.append(decode_embedding(chunk['embedding']))
+                else:
+                    vectors.append(None)
+                    stale.append(position)
+            
+            # Regenerate missing embeddings in batched requests
+            refreshed = []
+            if stale:
+                fresh = await self.generate_embeddings([all_chunks[pos]['chunk_text'] for pos in stale])
+                for pos, embedding in zip(stale, fresh):
+                    vectors[pos] = embedding
+                    refreshed.append((all_chunks[pos]['id'], embedding))
             
-            logger.info(f"Reloaded {len(all_chunks)} chunks into vector store")
+            await asyncio.to_thread(self._append, np.vstack(vectors).astype(np.float32, copy=False), chunks)
+            await db.run_in_thread(db.save_chunk_embeddings, refreshed, model)
+            
+            logger.info(
+                f"Reloaded {len(all_chunks)} chunks into vector store "
+                f"({len(refreshed)} re-embedded)"
+            )
             
         except Exception as e:
             logger.error(f"Error reloading vector store from database: {e}")
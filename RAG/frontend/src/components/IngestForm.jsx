@@ -7,6 +7,7 @@ function IngestForm({ onIngestSuccess }) {
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState('');
     const [success, setSuccess] = useState('');
+    const [progress, setProgress] = useState('');
 
     const handleSubmit = async (e) => {
         e.preventDefault();
@@ -15,15 +16,25 @@ function IngestForm({ onIngestSuccess }) {
         setLoading(true);
 
         try {
-            const { ingestContent } = await import('../services/api');
-            const result = await ingestContent(content, sourceType);
-            setSuccess(result.message);
+            const { ingestContent, waitForJob } = await import('../services/api');
+            const { job_id: jobId } = await ingestContent(content, sourceType);
             setContent('');
+            setProgress('Queued...');
+
+            await waitForJob(jobId, (job) => {
+                setProgress(
+                    job.chunks_total
+                        ? `Embedding ${job.chunks_embedded}/${job.chunks_total} chunks...`
+                        : job.attempts > 1 ? `Retrying (attempt ${job.attempts})...` : 'Processing...'
+                );
+            });
+            setSuccess(`Successfully ingested ${sourceType}`);
             if (onIngestSuccess) onIngestSuccess();
         } catch (err) {
             setError(err.message);
         } finally {
             setLoading(false);
+            setProgress('');
         }
     };
 
@@ -68,7 +79,7 @@ function IngestForm({ onIngestSuccess }) {
                 )}
 
                 <button type="submit" disabled={loading || !content.trim()}>
-                    {loading ? 'Processing...' : `Add ${sourceType === 'note' ? 'Note' : 'URL'}`}
+                    {loading ? progress || 'Processing...' : `Add ${sourceType === 'note' ? 'Note' : 'URL'}`}
                 </button>
             </form>
 
@@ -4,6 +4,7 @@ import './QueryInterface.css';
 
 function QueryInterface() {
     const [question, setQuestion] = useState('');
+    const [sourceType, setSourceType] = useState('');
     const [answer, setAnswer] = useState(null);
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState('');
@@ -15,9 +16,16 @@ function QueryInterface() {
         setLoading(true);
 
         try {
-            const { queryKnowledgeBase } = await import('../services/api');
-            const result = await queryKnowledgeBase(question);
-            setAnswer(result);
+            const { streamQuery } = await import('../services/api');
+            await streamQuery(question, {
+                // Sources arrive right after retrieval, before any answer text
+                onSources: (sources) => {
+                    setAnswer({ answer: '', sources });
+                },
+                onToken: (token) => {
+                    setAnswer((prev) => ({ ...prev, answer: prev.answer + token }));
+                },
+            }, 5, sourceType ? { source_type: sourceType } : {});
         } catch (err) {
             setError(err.message);
         } finally {
@@ -38,8 +46,13 @@ function QueryInterface() {
                         placeholder="What would you like to know?"
                         required
                     />
+                    <select value={sourceType} onChange={(e) => setSourceType(e.target.value)}>
+                        <option value="">All sources</option>
+                        <option value="note">Notes</option>
+                        <option value="url">URLs</option>
+                    </select>
                     <button type="submit" disabled={loading || !question.trim()}>
-                        {loading ? '🔍 Searching...' : '🔍 Ask'}
+                        {loading ? (answer ? '✍️ Answering...' : '🔍 Searching...') : '🔍 Ask'}
                     </button>
                 </div>
             </form>
@@ -35,6 +35,23 @@ export const ingestContent = async (content, sourceType) => {
     return response.data;
 };
 
+export const getJob = async (jobId) => {
+    const response = await api.get(`/jobs/${jobId}`);
+    return response.data;
+};
+
+// Ingestion runs in the background; poll the job until it finishes.
+// onProgress receives each job status while it is queued or running.
+export const waitForJob = async (jobId, onProgress, intervalMs = 1000) => {
+    while (true) {
+        const job = await getJob(jobId);
+        if (job.status === 'succeeded') return job;
+        if (job.status === 'failed') throw new Error(job.error || 'Ingestion failed');
+        if (onProgress) onProgress(job);
+        await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+};
+
 export const getItems = async (sourceType = null) => {
     const params = sourceType ? { source_type: sourceType } : {};
     const response = await api.get('/items', { params });
@@ -51,14 +68,69 @@ export const deleteItem = async (itemId) => {
     return response.data;
 };
 
-export const queryKnowledgeBase = async (question, maxResults = 5) => {
+// filters: optional { source_type, item_ids, created_after, created_before }
+export const queryKnowledgeBase = async (question, maxResults = 5, filters = {}) => {
     const response = await api.post('/query', {
         question,
         max_results: maxResults,
+        ...filters,
     });
     return response.data;
 };
 
+// Stream a query over Server-Sent Events. Axios buffers the whole response in
+// the browser, so this uses fetch and parses the event stream by hand.
+export const streamQuery = async (question, { onSources, onToken, onDone } = {}, maxResults = 5, filters = {}) => {
+    let response;
+    try {
+        response = await fetch(`${API_BASE_URL}/query/stream`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ question, max_results: maxResults, ...filters }),
+        });
+    } catch {
+        throw new Error('❌ Backend server is not running. Please start the backend server.');
+    }
+
+    if (!response.ok) {
+        const body = await response.json().catch(() => ({}));
+        throw new Error(body.detail || `Request failed with status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    const handleFrame = (frame) => {
+        let event = 'message';
+        const dataLines = [];
+        for (const line of frame.split('\n')) {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) dataLines.push(line.slice(5).trimStart());
+        }
+        if (dataLines.length === 0) return;
+        const data = JSON.parse(dataLines.join('\n'));
+
+        if (event === 'sources' && onSources) onSources(data);
+        else if (event === 'token' && onToken) onToken(data);
+        else if (event === 'done' && onDone) onDone(data);
+        else if (event === 'error') throw new Error(data.detail || 'An error occurred');
+    };
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            handleFrame(frame);
+        }
+    }
+};
+
 export const healthCheck = async () => {
     const response = await api.get('/health');
     return response.data;